@@ -1,28 +1,71 @@
+import functools
+import gzip
+import hashlib
 import io
+import json
+import logging
+import multiprocessing
+import queue
 import re
+import shutil
+import tempfile
+import socket
 import threading
-import webbrowser
+import time
+import traceback
+import uuid
 import os
 import sys
-from flask import Flask, render_template_string, request, send_file, make_response, jsonify, session
-from docxtpl import DocxTemplate
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import orjson
+from lxml import etree
+from flask import Flask, render_template, request, send_file, send_from_directory, make_response, jsonify, session
+from flask.json.provider import JSONProvider
+from werkzeug.datastructures import MultiDict
+from xml.sax.saxutils import escape as xml_escape
+import docx
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, qn as _qn
+from docx.shared import Pt, RGBColor
+from docx.table import _Cell
+from docx.text.run import Run
 from waitress import serve
 
-# --- Debug logging to file ---
-def debug_log(msg):
-    log_path = os.path.join(os.environ.get('LOCALAPPDATA', '.'), 'SOP_Generator', 'debug.log')
-    os.makedirs(os.path.dirname(log_path), exist_ok=True)
-    with open(log_path, 'a') as f:
-        f.write(f"{msg}\n")
+# --- Debug logging to file (enable with SOP_DEBUG=1) ---
+_LOG_ENABLED = os.environ.get('SOP_DEBUG') == '1'
+_log_file = None
+_log_lock = threading.Lock()
 
-debug_log(f"=== App starting ===")
-debug_log(f"sys.frozen: {getattr(sys, 'frozen', False)}")
-debug_log(f"sys.executable: {sys.executable}")
-debug_log(f"os.getcwd(): {os.getcwd()}")
+def debug_log(msg):
+    global _log_file
+    if not _LOG_ENABLED:
+        return
+    with _log_lock:
+        if _log_file is None:
+            log_path = os.path.join(os.environ.get('LOCALAPPDATA', '.'), 'SOP_Generator', 'debug.log')
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            # Line-buffered so every message still reaches disk, without reopening the file
+            _log_file = open(log_path, 'a', buffering=1)
+        _log_file.write(f"{msg}\n")
+
+# Errors go through logging so they can be routed/buffered instead of
+# print_exc() writing tracebacks straight to stdout
+log = logging.getLogger(__name__)
+
+if _LOG_ENABLED:
+    debug_log(f"=== App starting ===")
+    debug_log(f"sys.frozen: {getattr(sys, 'frozen', False)}")
+    debug_log(f"sys.executable: {sys.executable}")
+    debug_log(f"os.getcwd(): {os.getcwd()}")
 
 
 # Import our custom BPMN parser
-from bpmn_parser import parse_bpmn_to_sop, extract_metadata_from_bpmn
+from bpmn_parser import parse_bpmn_to_sop, extract_metadata_from_bpmn, parse_bpmn_root
 
 # Import history manager
 from history_manager import HistoryManager
@@ -31,83 +74,107 @@ from history_manager import HistoryManager
 from archive_manager import ArchiveManager
 
 # --- Helper function to find bundled files ---
+# Check for Nuitka (sets __compiled__ at module level) or PyInstaller (sets sys.frozen)
+_IS_NUITKA = "__compiled__" in globals()
+_IS_PYINSTALLER = getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS')
+_FROM_SOURCE = not (_IS_PYINSTALLER or _IS_NUITKA or 'Temp' in sys.executable)
+
+if _IS_PYINSTALLER:
+    _BASE_PATH = sys._MEIPASS
+elif not _FROM_SOURCE:
+    # Nuitka onefile extracts to temp - use executable's directory
+    _BASE_PATH = os.path.dirname(sys.executable)
+else:
+    # Running from source
+    _BASE_PATH = os.path.abspath(".")
+debug_log(f"Resource base path: {_BASE_PATH}")
+
+_TEMPLATE_FILES = frozenset({'final_master_template_2.docx', 'sana_template.docx', 'window_world_template.docx', 'tarabut_template.docx', 'sabah_template.docx'})
+
+@functools.lru_cache(maxsize=32)
 def resource_path(relative_path):
-    # Check for Nuitka (sets __compiled__ at module level) or PyInstaller (sets sys.frozen)
-    is_nuitka = "__compiled__" in globals()
-    is_pyinstaller = getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS')
-
-    if is_pyinstaller:
-        base_path = sys._MEIPASS
-        debug_log(f"Using PyInstaller _MEIPASS: {base_path}")
-    elif is_nuitka or 'Temp' in sys.executable:
-        # Nuitka onefile extracts to temp - use executable's directory
-        base_path = os.path.dirname(sys.executable)
-        debug_log(f"Using Nuitka exe dir: {base_path}")
-    else:
-        # Running from source
-        base_path = os.path.abspath(".")
-        debug_log(f"Using source dir: {base_path}")
+    # Results are cached: the base path and bundled files don't change while the app runs
+    if _FROM_SOURCE:
         # Special handling for template files
-        if relative_path in ('final_master_template_2.docx', 'sana_template.docx', 'window_world_template.docx', 'tarabut_template.docx', 'sabah_template.docx'):
-            deployment_path = os.path.join(base_path, 'SOP_Generator_Deployment', relative_path)
+        if relative_path in _TEMPLATE_FILES:
+            deployment_path = os.path.join(_BASE_PATH, 'SOP_Generator_Deployment', relative_path)
             if os.path.exists(deployment_path):
                 return deployment_path
-    result = os.path.join(base_path, relative_path)
-    debug_log(f"resource_path('{relative_path}') -> {result} (exists: {os.path.exists(result)})")
+    result = os.path.join(_BASE_PATH, relative_path)
+    if _LOG_ENABLED:
+        debug_log(f"resource_path('{relative_path}') -> {result} (exists: {os.path.exists(result)})")
     return result
 
 # --- Flask App Initialization ---
-app = Flask(__name__)
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson - faster than the stdlib json module and
+    writes response bodies as bytes without an extra str -> bytes encode"""
+    OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.OPTIONS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self.OPTIONS), mimetype='application/json')
+
+# static_folder=None: static files are served by static_file() below so they resolve via resource_path
+app = Flask(__name__, static_folder=None)
+app.json = OrjsonProvider(app)
 app.secret_key = 'sop-generator-secret-key-change-in-production'  # For session management
+# Upper bound for request bodies (BPMN uploads / pasted XML); larger requests get a 413
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# Page templates are compiled once from strings below; never re-check them
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+
+# --- Static CSS/JS ---
+STATIC_DIR = resource_path('static')
+STATIC_MAX_AGE = 31536000  # one year; URLs carry a content hash, so a new build is a new URL
+
+@functools.lru_cache(maxsize=None)
+def _static_version(filename):
+    with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()[:12]
+
+@app.template_global()
+def static_url(filename):
+    """Cache-busting URL for a file in static/"""
+    return f"/static/{filename}?v={_static_version(filename)}"
+
+@app.route('/static/<path:filename>')
+def static_file(filename):
+    # Only versioned URLs (from static_url) may be cached for good
+    versioned = bool(request.args.get('v'))
+    response = send_from_directory(STATIC_DIR, filename, max_age=STATIC_MAX_AGE if versioned else None)
+    if versioned:
+        response.cache_control.immutable = True
+    return response
 
 PREVIEW_HTML = r'''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <title>SOP Generator - Preview</title>
-    <style>
-        body { font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif; margin: 0; background-color: #f8f9fa; }
-        .container { max-width: 900px; margin: 0 auto; padding: 2em; background: white; min-height: 100vh; box-shadow: 0 0 20px rgba(0,0,0,0.08); }
-        h1 { color: #343a40; border-bottom: 2px solid #007bff; padding-bottom: 0.5em; margin-top: 0; font-size: 1.4em; }
-        h2 { color: #495057; margin-top: 1.5em; font-size: 1.1em; border-bottom: 1px solid #dee2e6; padding-bottom: 0.3em; }
-        .form-grid { display: grid; grid-template-columns: 1fr 1fr; gap: 1em; }
-        .form-group { display: flex; flex-direction: column; }
-        .full-width { grid-column: 1 / -1; }
-        label { margin-bottom: 0.3em; font-weight: 600; color: #495057; font-size: 0.9em; }
-        input[type="text"], textarea { font-size: 0.95rem; padding: 0.6em; border: 1px solid #ced4da; border-radius: 6px; box-sizing: border-box; }
-        input[type="text"]:focus, textarea:focus { border-color: #80bdff; outline: 0; box-shadow: 0 0 0 0.15rem rgba(0,123,255,.25); }
-        .auto-filled { background-color: #e8f5e9; }
-        .btn-row { display: flex; gap: 1em; margin-top: 2em; justify-content: center; }
-        .btn { padding: 0.8em 2em; border: none; border-radius: 8px; font-size: 1em; font-weight: 600; cursor: pointer; }
-        .btn-primary { background-color: #007bff; color: white; }
-        .btn-primary:hover { background-color: #0056b3; }
-        .btn-secondary { background-color: #6c757d; color: white; }
-        .btn-secondary:hover { background-color: #545b62; }
-        .btn:disabled { opacity: 0.6; cursor: not-allowed; }
-        .dynamic-list .entry { display: grid; grid-template-columns: 1fr 2fr auto; gap: 0.5em; margin-bottom: 0.5em; }
-        .add-btn { background-color: #28a745; color: white; border: none; border-radius: 6px; padding: 0.4em 1em; cursor: pointer; font-size: 0.85em; }
-        .remove-btn { background-color: #dc3545; color: white; border: none; border-radius: 6px; padding: 0.4em 0.8em; cursor: pointer; font-size: 0.85em; }
-        .spinner { display: inline-block; border: 3px solid #f3f3f3; border-top: 3px solid #007bff; border-radius: 50%; width: 18px; height: 18px; animation: spin 1s linear infinite; vertical-align: middle; margin-right: 0.5em; }
-        @keyframes spin { 0% { transform: rotate(0deg); } 100% { transform: rotate(360deg); } }
-        .template-btn { padding: 0.5em 1.2em; border: 2px solid #ced4da; border-radius: 6px; background: white; cursor: pointer; font-weight: 600; font-size: 0.9em; color: #495057; transition: all 0.2s; }
-        .template-btn:hover { border-color: #007bff; color: #007bff; }
-        .template-btn.active { background: #007bff; color: white; border-color: #007bff; }
-    </style>
+    <link rel="stylesheet" href="{{ static_url('preview.css') }}">
+    <script src="{{ static_url('preview.js') }}" defer></script>
 </head>
 <body>
     <div class="container">
         <h1>SOP Generator - Review & Generate</h1>
         <p style="color: #6c757d; margin-top: -0.5em; font-size: 0.9em;">Review the auto-populated metadata below, make any changes, then click Generate.</p>
 
-        <form id="sop-form">
+        <form id="sop-form" data-session-id="{{ session_id }}">
 
             <div style="display:flex;align-items:center;gap:12px;margin-bottom:20px;padding:14px 16px;background-color:#dee2e6;border-radius:8px;border:2px solid #adb5bd;">
                 <span style="margin:0;font-weight:700;color:#212529;font-size:1.1em;">Template:</span>
-                <button type="button" id="btn-earthlink" data-template="earthlink" onclick="selectTemplate('earthlink')" style="padding:10px 24px;border:2px solid #007bff;border-radius:8px;background-color:#007bff;color:white;cursor:pointer;font-weight:700;font-size:1.05em;">Earthlink</button>
-                <button type="button" id="btn-sana" data-template="sana" onclick="selectTemplate('sana')" style="padding:10px 24px;border:2px solid #6c757d;border-radius:8px;background-color:white;color:#343a40;cursor:pointer;font-weight:700;font-size:1.05em;">SANA</button>
-                <button type="button" id="btn-window_world" data-template="window_world" onclick="selectTemplate('window_world')" style="padding:10px 24px;border:2px solid #6c757d;border-radius:8px;background-color:white;color:#343a40;cursor:pointer;font-weight:700;font-size:1.05em;">Window World</button>
-                <button type="button" id="btn-tarabut" data-template="tarabut" onclick="selectTemplate('tarabut')" style="padding:10px 24px;border:2px solid #6c757d;border-radius:8px;background-color:white;color:#343a40;cursor:pointer;font-weight:700;font-size:1.05em;">Tarabut</button>
-                <button type="button" id="btn-sabah" data-template="sabah" onclick="selectTemplate('sabah')" style="padding:10px 24px;border:2px solid #6c757d;border-radius:8px;background-color:white;color:#343a40;cursor:pointer;font-weight:700;font-size:1.05em;">Sabah</button>
+                <button type="button" id="btn-earthlink" class="template-btn active" data-template="earthlink" onclick="selectTemplate('earthlink')">Earthlink</button>
+                <button type="button" id="btn-sana" class="template-btn" data-template="sana" onclick="selectTemplate('sana')">SANA</button>
+                <button type="button" id="btn-window_world" class="template-btn" data-template="window_world" onclick="selectTemplate('window_world')">Window World</button>
+                <button type="button" id="btn-tarabut" class="template-btn" data-template="tarabut" onclick="selectTemplate('tarabut')">Tarabut</button>
+                <button type="button" id="btn-sabah" class="template-btn" data-template="sabah" onclick="selectTemplate('sabah')">Sabah</button>
                 <input type="hidden" name="template" id="template-input" value="earthlink">
             </div>
 
@@ -223,92 +290,6 @@ PREVIEW_HTML = r'''<!DOCTYPE html>
         </form>
     </div>
 
-    <script>
-        // Auto-fill today's date
-        (function() {
-            var d = new Date();
-            var months = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec'];
-            document.getElementById('release_date').value =
-                String(d.getDate()).padStart(2,'0') + ' ' + months[d.getMonth()] + ' ' + d.getFullYear();
-        })();
-
-        function selectTemplate(name) {
-            document.getElementById('template-input').value = name;
-            var all = ['earthlink', 'sana', 'window_world', 'tarabut', 'sabah'];
-            all.forEach(function(t) {
-                var btn = document.getElementById('btn-' + t);
-                if (t === name) {
-                    btn.style.backgroundColor = '#007bff';
-                    btn.style.color = 'white';
-                    btn.style.borderColor = '#007bff';
-                } else {
-                    btn.style.backgroundColor = 'white';
-                    btn.style.color = '#343a40';
-                    btn.style.borderColor = '#6c757d';
-                }
-            });
-        }
-
-        function addEntry(containerId, name1, name2, placeholder1, placeholder2) {
-            var container = document.getElementById(containerId);
-            var div = document.createElement('div');
-            div.className = 'entry';
-            div.innerHTML =
-                '<input type="text" name="' + name1 + '" placeholder="' + placeholder1 + '">' +
-                '<input type="text" name="' + name2 + '" placeholder="' + placeholder2 + '">' +
-                '<button type="button" class="remove-btn" onclick="removeEntry(this)">X</button>';
-            container.appendChild(div);
-        }
-
-        function removeEntry(btn) {
-            var container = btn.parentElement.parentElement;
-            if (container.children.length > 1) {
-                btn.parentElement.remove();
-            }
-        }
-
-        function closeModal() {
-            // Tell parent (Camunda Modeler) to close the modal
-            if (window.parent && window.parent !== window) {
-                window.parent.postMessage('sop-close-modal', '*');
-            } else {
-                window.close();
-            }
-        }
-
-        // Handle form submit - send data to parent window via postMessage
-        document.getElementById('sop-form').addEventListener('submit', function(e) {
-            e.preventDefault();
-
-            var btn = document.getElementById('generate-btn');
-            btn.disabled = true;
-            btn.innerHTML = '<span class="spinner"></span>Generating...';
-
-            // Serialize form data as URL-encoded string
-            var formData = new FormData(this);
-            var body = new URLSearchParams(formData).toString();
-
-            // Send to parent (Camunda Modeler) for download
-            window.parent.postMessage({
-                type: 'sop-generate',
-                session_id: '{{ session_id }}',
-                body: body
-            }, '*');
-        });
-
-        // Listen for response from parent
-        window.addEventListener('message', function(e) {
-            if (e.data === 'sop-download-complete' || e.data === 'sop-download-error') {
-                var btn = document.getElementById('generate-btn');
-                btn.disabled = false;
-                btn.innerHTML = 'Generate & Download .docx';
-
-                if (e.data === 'sop-download-error') {
-                    window.alert('Error generating document. Please try again.');
-                }
-            }
-        });
-    </script>
 </body>
 </html>
 '''
@@ -318,40 +299,8 @@ INDEX_HTML = r'''<!DOCTYPE html>
 <head>
     <meta charset="UTF-8">
     <title>BPMN to SOP Generator</title>
-    <style>
-        body { font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif; margin: 0; background-color: #f8f9fa; }
-        .main-layout { display: flex; gap: 1.5em; padding: 1.5em; max-width: 1400px; margin: 0 auto; }
-        .container { flex: 1; background: white; padding: 2em; border-radius: 12px; box-shadow: 0 4px 20px rgba(0,0,0,0.08); }
-        .archive-panel { width: 320px; background: white; padding: 1.5em; border-radius: 12px; box-shadow: 0 4px 20px rgba(0,0,0,0.08); max-height: calc(100vh - 3em); overflow-y: auto; }
-        h1, h2 { color: #343a40; border-bottom: 1px solid #dee2e6; padding-bottom: 0.5em; margin-top: 1.5em; }
-        h1 { margin-top: 0; }
-        .form-grid { display: grid; grid-template-columns: 1fr 1fr; gap: 1.5em; }
-        .form-group { display: flex; flex-direction: column; }
-        label { margin-bottom: 0.5em; font-weight: 600; color: #495057; }
-        input[type="text"], textarea { font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; box-sizing: border-box; transition: border-color 0.2s, box-shadow 0.2s; }
-        input[type="text"]:focus, textarea:focus { border-color: #80bdff; outline: 0; box-shadow: 0 0 0 0.2rem rgba(0,123,255,.25); }
-        input[type="file"] { border: 1px solid #ced4da; border-radius: 8px; padding: 0.5em; }
-        .full-width { grid-column: 1 / -1; }
-        .submit-btn { background-color: #007bff; color: white; padding: 0.8em 1.5em; border: none; border-radius: 8px; font-size: 1.1em; font-weight: 600; cursor: pointer; margin-top: 1.5em; transition: background-color 0.2s; }
-        .submit-btn:hover { background-color: #0056b3; }
-        .submit-btn:disabled { background-color: #5a6268; cursor: not-allowed; }
-        #loader { text-align: center; margin-top: 2em; display: none; }
-        .spinner { margin: auto; border: 4px solid #f3f3f3; border-top: 4px solid #007bff; border-radius: 50%; width: 40px; height: 40px; animation: spin 1s linear infinite; }
-        @keyframes spin { 0% { transform: rotate(0deg); } 100% { transform: rotate(360deg); } }
-        .archive-item { background: #f8f9fa; border-radius: 8px; padding: 1em; margin-bottom: 0.75em; }
-        .archive-item-header { display: flex; justify-content: space-between; align-items: start; }
-        .archive-item-title { font-weight: 600; color: #343a40; font-size: 0.9em; word-break: break-word; }
-        .archive-item-date { font-size: 0.75em; color: #6c757d; margin-top: 0.25em; }
-        .archive-item-actions { display: flex; gap: 0.5em; margin-top: 0.75em; }
-        .archive-btn { padding: 0.4em 0.6em; border: none; border-radius: 4px; cursor: pointer; font-size: 0.75em; }
-        .archive-btn-bpmn { background: #17a2b8; color: white; }
-        .archive-btn-docx { background: #28a745; color: white; }
-        .archive-btn-delete { background: #dc3545; color: white; }
-        .archive-btn:hover { opacity: 0.9; }
-        .template-btn { padding: 0.7em 2em; border: 2px solid #6c757d; border-radius: 8px; background: white; cursor: pointer; font-weight: 700; font-size: 1.05em; color: #343a40; transition: all 0.2s; }
-        .template-btn:hover { border-color: #007bff; color: #007bff; }
-        .template-btn.active { background: #007bff; color: white; border-color: #007bff; }
-    </style>
+    <link rel="stylesheet" href="{{ static_url('index.css') }}">
+    <script src="{{ static_url('index.js') }}" defer></script>
 </head>
 <body>
     <div class="main-layout">
@@ -362,11 +311,11 @@ INDEX_HTML = r'''<!DOCTYPE html>
 
         <div id="template-selector" style="display:flex;align-items:center;gap:12px;margin-bottom:20px;padding:14px 16px;background-color:#dee2e6;border-radius:8px;border:2px solid #adb5bd;">
             <span style="margin:0;font-weight:700;color:#212529;font-size:1.1em;">Template:</span>
-            <button type="button" id="btn-earthlink" data-template="earthlink" onclick="selectTemplate('earthlink')" style="padding:10px 24px;border:2px solid #007bff;border-radius:8px;background-color:#007bff;color:white;cursor:pointer;font-weight:700;font-size:1.05em;">Earthlink</button>
-            <button type="button" id="btn-sana" data-template="sana" onclick="selectTemplate('sana')" style="padding:10px 24px;border:2px solid #6c757d;border-radius:8px;background-color:white;color:#343a40;cursor:pointer;font-weight:700;font-size:1.05em;">SANA</button>
-            <button type="button" id="btn-window_world" data-template="window_world" onclick="selectTemplate('window_world')" style="padding:10px 24px;border:2px solid #6c757d;border-radius:8px;background-color:white;color:#343a40;cursor:pointer;font-weight:700;font-size:1.05em;">Window World</button>
-            <button type="button" id="btn-tarabut" data-template="tarabut" onclick="selectTemplate('tarabut')" style="padding:10px 24px;border:2px solid #6c757d;border-radius:8px;background-color:white;color:#343a40;cursor:pointer;font-weight:700;font-size:1.05em;">Tarabut</button>
-            <button type="button" id="btn-sabah" data-template="sabah" onclick="selectTemplate('sabah')" style="padding:10px 24px;border:2px solid #6c757d;border-radius:8px;background-color:white;color:#343a40;cursor:pointer;font-weight:700;font-size:1.05em;">Sabah</button>
+            <button type="button" id="btn-earthlink" class="template-btn active" data-template="earthlink" onclick="selectTemplate('earthlink')">Earthlink</button>
+            <button type="button" id="btn-sana" class="template-btn" data-template="sana" onclick="selectTemplate('sana')">SANA</button>
+            <button type="button" id="btn-window_world" class="template-btn" data-template="window_world" onclick="selectTemplate('window_world')">Window World</button>
+            <button type="button" id="btn-tarabut" class="template-btn" data-template="tarabut" onclick="selectTemplate('tarabut')">Tarabut</button>
+            <button type="button" id="btn-sabah" class="template-btn" data-template="sabah" onclick="selectTemplate('sabah')">Sabah</button>
             <input type="hidden" name="template" id="template-input" value="earthlink">
         </div>
 
@@ -405,30 +354,30 @@ INDEX_HTML = r'''<!DOCTYPE html>
                 <div class="abbrev-entry" style="display: grid; grid-template-columns: 1fr 2fr auto; gap: 1em; margin-bottom: 1em;">
                     <input type="text" name="abbrev_term[]" placeholder="Term (e.g., BPMN)" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
                     <input type="text" name="abbrev_def[]" placeholder="Definition (e.g., Business Process Model and Notation)" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                    <button type="button" class="remove-btn" onclick="removeAbbrev(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
+                    <button type="button" class="remove-btn" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
                 </div>
             </div>
-            <button type="button" onclick="addAbbrev()" style="background-color: #28a745; color: white; border: none; border-radius: 8px; padding: 0.6em 1.2em; cursor: pointer; margin-bottom: 1em;">+ Add Abbreviation</button>
+            <button type="button" onclick="addRow('abbrev')" style="background-color: #28a745; color: white; border: none; border-radius: 8px; padding: 0.6em 1.2em; cursor: pointer; margin-bottom: 1em;">+ Add Abbreviation</button>
 
             <h2 style="margin-top: 2em;">Referenced Documents and Approvals</h2>
             <div id="references-container">
                 <div class="ref-entry" style="display: grid; grid-template-columns: 1fr 2fr auto; gap: 1em; margin-bottom: 1em;">
                     <input type="text" name="ref_id[]" placeholder="Document ID (e.g., DOC-001)" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
                     <input type="text" name="ref_title[]" placeholder="Document Title" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                    <button type="button" class="remove-btn" onclick="removeRef(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
+                    <button type="button" class="remove-btn" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
                 </div>
             </div>
-            <button type="button" onclick="addRef()" style="background-color: #28a745; color: white; border: none; border-radius: 8px; padding: 0.6em 1.2em; cursor: pointer; margin-bottom: 1em;">+ Add Referenced Document</button>
+            <button type="button" onclick="addRow('ref')" style="background-color: #28a745; color: white; border: none; border-radius: 8px; padding: 0.6em 1.2em; cursor: pointer; margin-bottom: 1em;">+ Add Referenced Document</button>
 
             <h2 style="margin-top: 2em;">Ref. General Policies</h2>
             <div id="policies-container">
                 <div class="policy-entry" style="display: grid; grid-template-columns: 1fr 2fr auto; gap: 1em; margin-bottom: 1em;">
                     <input type="text" name="policy_ref[]" placeholder="Ref (e.g., 1)" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
                     <input type="text" name="policy_text[]" placeholder="General Policy" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                    <button type="button" class="remove-btn" onclick="removePolicy(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
+                    <button type="button" class="remove-btn" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
                 </div>
             </div>
-            <button type="button" onclick="addPolicy()" style="background-color: #28a745; color: white; border: none; border-radius: 8px; padding: 0.6em 1.2em; cursor: pointer; margin-bottom: 1em;">+ Add General Policy</button>
+            <button type="button" onclick="addRow('policy')" style="background-color: #28a745; color: white; border: none; border-radius: 8px; padding: 0.6em 1.2em; cursor: pointer; margin-bottom: 1em;">+ Add General Policy</button>
 
             <!-- Process Inputs and Outputs are auto-populated from BPMN start/end events -->
 
@@ -469,683 +418,12 @@ INDEX_HTML = r'''<!DOCTYPE html>
         </div>
 
     </div>
-            <script>
-                function selectTemplate(name) {
-                    document.getElementById('template-input').value = name;
-                    var all = ['earthlink', 'sana', 'window_world', 'tarabut', 'sabah'];
-                    all.forEach(function(t) {
-                        var btn = document.getElementById('btn-' + t);
-                        if (t === name) {
-                            btn.style.backgroundColor = '#007bff';
-                            btn.style.color = 'white';
-                            btn.style.borderColor = '#007bff';
-                        } else {
-                            btn.style.backgroundColor = 'white';
-                            btn.style.color = '#343a40';
-                            btn.style.borderColor = '#6c757d';
-                        }
-                    });
-                }
-
-                function getCookie(name) {
-                    let value = "; " + document.cookie;
-                    let parts = value.split("; " + name + "=");
-                    if (parts.length === 2) return parts.pop().split(";").shift();
-                }
-
-                // Auto-fill release date with today's date
-                function setTodaysDate() {
-                    const today = new Date();
-                    const day = String(today.getDate()).padStart(2, '0');
-                    const months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
-                    const month = months[today.getMonth()];
-                    const year = today.getFullYear();
-                    const formattedDate = `${day} ${month} ${year}`;
-                    document.getElementById('release_date').value = formattedDate;
-                }
-
-                // Call setTodaysDate when page loads
-                window.addEventListener('DOMContentLoaded', setTodaysDate);
-
-                // History Management Functions
-                let historyData = [];
-
-                // Fetch history from server
-                async function fetchHistory() {
-                    try {
-                        const response = await fetch('/api/history');
-                        if (response.ok) {
-                            historyData = await response.json();
-                            populateHistoryDropdown();
-                        }
-                    } catch (error) {
-                        console.error('Error fetching history:', error);
-                    }
-                }
-
-                // Populate history dropdown
-                function populateHistoryDropdown() {
-                    const select = document.getElementById('history-select');
-                    // Clear existing options except the first one
-                    while (select.options.length > 1) {
-                        select.remove(1);
-                    }
-
-                    // Add history entries
-                    historyData.forEach((entry, index) => {
-                        const option = document.createElement('option');
-                        option.value = index;
-
-                        // Format the display text with date and time
-                        const dt = new Date(entry.timestamp);
-                        const timestamp = dt.toLocaleDateString() + ' ' + dt.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
-                        const processName = entry.process_name || 'Unnamed';
-                        const processCode = entry.process_code ? ` (${entry.process_code})` : '';
-                        option.textContent = `${timestamp} - ${processName}${processCode}`;
-
-                        select.appendChild(option);
-                    });
-                }
-
-                // Load selected history entry into form
-                function loadHistoryEntry() {
-                    const select = document.getElementById('history-select');
-                    const selectedIndex = select.value;
-
-                    if (selectedIndex === '') {
-                        alert('Please select an entry from history');
-                        return;
-                    }
-
-                    const entry = historyData[selectedIndex];
-                    if (!entry) {
-                        alert('Error loading history entry');
-                        return;
-                    }
-
-                    // Populate form fields
-                    document.getElementById('process_name').value = entry.process_name || '';
-                    document.getElementById('process_code').value = entry.process_code || '';
-                    document.getElementById('purpose').value = entry.purpose || '';
-                    document.getElementById('scope').value = entry.scope || '';
-
-                    // Populate abbreviations
-                    const abbrevContainer = document.getElementById('abbreviations-container');
-                    abbrevContainer.innerHTML = ''; // Clear existing
-                    const abbreviations = entry.abbreviations_list || [];
-                    if (abbreviations.length > 0) {
-                        abbreviations.forEach(abbrev => {
-                            const entry = document.createElement('div');
-                            entry.style.display = 'grid';
-                            entry.style.gridTemplateColumns = '1fr 2fr auto';
-                            entry.style.gap = '1em';
-                            entry.style.marginBottom = '1em';
-                            entry.innerHTML = `
-                                <input type="text" name="abbrev_term[]" placeholder="Term" value="${abbrev.term || ''}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                                <input type="text" name="abbrev_def[]" placeholder="Definition" value="${abbrev.definition || ''}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                                <button type="button" onclick="removeAbbrev(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
-                            `;
-                            abbrevContainer.appendChild(entry);
-                        });
-                    } else {
-                        addAbbrev(); // Add one empty entry
-                    }
-
-                    // Populate referenced documents
-                    const refsContainer = document.getElementById('references-container');
-                    refsContainer.innerHTML = ''; // Clear existing
-                    const references = entry.references_list || [];
-                    if (references.length > 0) {
-                        references.forEach(ref => {
-                            const entry = document.createElement('div');
-                            entry.style.display = 'grid';
-                            entry.style.gridTemplateColumns = '1fr 2fr auto';
-                            entry.style.gap = '1em';
-                            entry.style.marginBottom = '1em';
-                            entry.innerHTML = `
-                                <input type="text" name="ref_id[]" placeholder="Document ID" value="${ref.id || ''}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                                <input type="text" name="ref_title[]" placeholder="Document Title" value="${ref.title || ''}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                                <button type="button" onclick="removeRef(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
-                            `;
-                            refsContainer.appendChild(entry);
-                        });
-                    } else {
-                        addRef(); // Add one empty entry
-                    }
-
-                    // Populate general policies
-                    const policiesContainer = document.getElementById('policies-container');
-                    policiesContainer.innerHTML = '';
-                    const policies = entry.general_policies_list || [];
-                    if (policies.length > 0) {
-                        policies.forEach(pol => {
-                            const pEntry = document.createElement('div');
-                            pEntry.style.display = 'grid';
-                            pEntry.style.gridTemplateColumns = '1fr 2fr auto';
-                            pEntry.style.gap = '1em';
-                            pEntry.style.marginBottom = '1em';
-                            pEntry.innerHTML = `
-                                <input type="text" name="policy_ref[]" placeholder="Ref" value="${escapeHtml(pol.ref || '')}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                                <input type="text" name="policy_text[]" placeholder="General Policy" value="${escapeHtml(pol.policy || '')}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                                <button type="button" onclick="removePolicy(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
-                            `;
-                            policiesContainer.appendChild(pEntry);
-                        });
-                    } else {
-                        addPolicy();
-                    }
-
-                    alert('History entry loaded successfully!');
-                }
-
-                // Fetch history on page load
-                window.addEventListener('DOMContentLoaded', fetchHistory);
-
-                // Dynamic abbreviation entries
-                function addAbbrev() {
-                    const container = document.getElementById('abbreviations-container');
-                    const entry = document.createElement('div');
-                    entry.className = 'abbrev-entry';
-                    entry.style.display = 'grid';
-                    entry.style.gridTemplateColumns = '1fr 2fr auto';
-                    entry.style.gap = '1em';
-                    entry.style.marginBottom = '1em';
-                    entry.innerHTML = `
-                        <input type="text" name="abbrev_term[]" placeholder="Term" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                        <input type="text" name="abbrev_def[]" placeholder="Definition" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                        <button type="button" onclick="removeAbbrev(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
-                    `;
-                    container.appendChild(entry);
-                }
-
-                function removeAbbrev(btn) {
-                    const container = document.getElementById('abbreviations-container');
-                    if (container.children.length > 1) {
-                        btn.parentElement.remove();
-                    } else {
-                        alert('At least one abbreviation entry must remain.');
-                    }
-                }
-
-                // Dynamic reference entries
-                function addRef() {
-                    const container = document.getElementById('references-container');
-                    const entry = document.createElement('div');
-                    entry.className = 'ref-entry';
-                    entry.style.display = 'grid';
-                    entry.style.gridTemplateColumns = '1fr 2fr auto';
-                    entry.style.gap = '1em';
-                    entry.style.marginBottom = '1em';
-                    entry.innerHTML = `
-                        <input type="text" name="ref_id[]" placeholder="Document ID" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                        <input type="text" name="ref_title[]" placeholder="Document Title" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                        <button type="button" onclick="removeRef(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
-                    `;
-                    container.appendChild(entry);
-                }
-
-                function removeRef(btn) {
-                    const container = document.getElementById('references-container');
-                    if (container.children.length > 1) {
-                        btn.parentElement.remove();
-                    } else {
-                        alert('At least one reference entry must remain.');
-                    }
-                }
-
-                // Dynamic general policy entries
-                function addPolicy() {
-                    const container = document.getElementById('policies-container');
-                    const entry = document.createElement('div');
-                    entry.className = 'policy-entry';
-                    entry.style.display = 'grid';
-                    entry.style.gridTemplateColumns = '1fr 2fr auto';
-                    entry.style.gap = '1em';
-                    entry.style.marginBottom = '1em';
-                    entry.innerHTML = `
-                        <input type="text" name="policy_ref[]" placeholder="Ref" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                        <input type="text" name="policy_text[]" placeholder="General Policy" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">
-                        <button type="button" onclick="removePolicy(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
-                    `;
-                    container.appendChild(entry);
-                }
-
-                function removePolicy(btn) {
-                    const container = document.getElementById('policies-container');
-                    if (container.children.length > 1) {
-                        btn.parentElement.remove();
-                    } else {
-                        alert('At least one policy entry must remain.');
-                    }
-                }
-
-                const inputTypeBpmn = document.getElementById('input_type_bpmn');
-                const inputTypeXml = document.getElementById('input_type_xml');
-                const bpmnUploadSection = document.getElementById('bpmn-upload-section');
-                const xmlPasteSection = document.getElementById('xml-paste-section');
-                const bpmnFile = document.getElementById('bpmn_file');
-                const xmlCode = document.getElementById('xml_code');
-
-                function toggleInputSections() {
-                    if (inputTypeBpmn.checked) {
-                        bpmnUploadSection.style.display = 'block';
-                        xmlPasteSection.style.display = 'none';
-                        bpmnFile.setAttribute('required', 'required');
-                        xmlCode.removeAttribute('required');
-                    } else {
-                        bpmnUploadSection.style.display = 'none';
-                        xmlPasteSection.style.display = 'block';
-                        xmlCode.setAttribute('required', 'required');
-                        bpmnFile.removeAttribute('required');
-                    }
-                }
-
-                inputTypeBpmn.addEventListener('change', toggleInputSections);
-                inputTypeXml.addEventListener('change', toggleInputSections);
-
-                // Initialize on page load
-                toggleInputSections();
-
-                document.getElementById('sop-form').addEventListener('submit', async function(e) {
-                    e.preventDefault();
-
-                    const btn = document.getElementById('generate-btn');
-                    const loader = document.getElementById('loader');
-                    const form = e.target;
-
-                    loader.style.display = 'block';
-                    btn.disabled = true;
-                    btn.textContent = 'Generating...';
-
-                    try {
-                        const formData = new FormData(form);
-                        const response = await fetch('/generate', {
-                            method: 'POST',
-                            body: formData
-                        });
-
-                        const result = await response.json();
-
-                        if (result.success) {
-                            alert('Document saved successfully!\n\n' + result.path);
-                            fetchHistory();
-                            loadArchives();
-                        } else {
-                            alert(result.message || 'Generation cancelled or failed');
-                        }
-                    } catch (error) {
-                        console.error('Error:', error);
-                        alert('An error occurred during generation');
-                    } finally {
-                        loader.style.display = 'none';
-                        btn.disabled = false;
-                        btn.textContent = 'Generate SOP Document';
-                    }
-                });
-
-                // Archive functions
-                async function loadArchives() {
-                    try {
-                        const response = await fetch('/api/archive/list');
-                        const data = await response.json();
-                        displayArchives(data.archives || []);
-                    } catch (error) {
-                        console.error('Error loading archives:', error);
-                    }
-                }
-
-                let archivesData = [];
-
-                function displayArchives(archives) {
-                    archivesData = archives;
-                    const select = document.getElementById('archive-select');
-                    const actions = document.getElementById('archive-actions');
-
-                    // Clear and populate dropdown
-                    select.innerHTML = '<option value="">-- Select a backup --</option>';
-
-                    if (!archives || archives.length === 0) {
-                        actions.style.display = 'none';
-                        return;
-                    }
-
-                    archives.forEach((archive, index) => {
-                        const dt = new Date(archive.created_at);
-                        const dateTime = dt.toLocaleDateString() + ' ' + dt.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
-                        const option = document.createElement('option');
-                        option.value = index;
-                        option.textContent = `${archive.process_name} - ${dateTime}`;
-                        select.appendChild(option);
-                    });
-                }
-
-                function onArchiveSelect() {
-                    const select = document.getElementById('archive-select');
-                    const actions = document.getElementById('archive-actions');
-                    actions.style.display = select.value !== '' ? 'flex' : 'none';
-                }
-
-                function getSelectedArchiveId() {
-                    const select = document.getElementById('archive-select');
-                    if (select.value === '') return null;
-                    return archivesData[parseInt(select.value)].id;
-                }
-
-                async function downloadBpmn() {
-                    const id = getSelectedArchiveId();
-                    if (!id) return;
-                    const response = await fetch(`/api/archive/${id}/bpmn`);
-                    const result = await response.json();
-                    if (result.success) {
-                        alert('BPMN saved to: ' + result.path);
-                    }
-                }
-
-                async function downloadDocx() {
-                    const id = getSelectedArchiveId();
-                    if (!id) return;
-                    const response = await fetch(`/api/archive/${id}/docx`);
-                    const result = await response.json();
-                    if (result.success) {
-                        alert('Document saved to: ' + result.path);
-                    }
-                }
-
-                async function deleteSelectedArchive() {
-                    const id = getSelectedArchiveId();
-                    if (!id) return;
-                    if (!confirm('Delete this backup?')) return;
-                    try {
-                        const response = await fetch(`/api/archive/${id}`, { method: 'DELETE' });
-                        const result = await response.json();
-                        if (result.success) {
-                            document.getElementById('archive-actions').style.display = 'none';
-                            loadArchives();
-                        }
-                    } catch (error) {
-                        console.error('Error deleting:', error);
-                    }
-                }
-
-                // Load archives on page load
-                window.addEventListener('DOMContentLoaded', loadArchives);
-
-                // --- Toggle Metadata Sections ---
-                function toggleMetadata() {
-                    const sections = document.getElementById('metadata-sections');
-                    const btn = document.getElementById('toggle-metadata-btn');
-                    if (sections.style.display === 'none') {
-                        sections.style.display = 'block';
-                        btn.innerHTML = '&#9660; Hide Metadata &amp; Settings';
-                    } else {
-                        sections.style.display = 'none';
-                        btn.innerHTML = '&#9654; Show Metadata &amp; Settings';
-                    }
-                }
-
-                // --- BPMN Metadata Auto-Fill ---
-
-                function escapeHtml(text) {
-                    const div = document.createElement('div');
-                    div.textContent = text;
-                    return div.innerHTML;
-                }
-
-                function resetFormFields() {
-                    // Clear text fields
-                    ['process_name', 'process_code', 'purpose', 'scope'].forEach(id => {
-                        const field = document.getElementById(id);
-                        if (field) {
-                            field.value = '';
-                            field.style.backgroundColor = '';
-                        }
-                    });
-
-                    // Reset abbreviations to one empty entry
-                    const abbrevContainer = document.getElementById('abbreviations-container');
-                    abbrevContainer.innerHTML = '';
-                    addAbbrev();
-
-                    // Reset references to one empty entry
-                    const refsContainer = document.getElementById('references-container');
-                    refsContainer.innerHTML = '';
-                    addRef();
-
-                    // Reset policies to one empty entry
-                    const policiesContainer = document.getElementById('policies-container');
-                    policiesContainer.innerHTML = '';
-                    addPolicy();
-                }
-
-                function autoFillFromBpmn(metadata) {
-                    // Simple text fields - only fill if currently empty
-                    const fieldMappings = {
-                        'process_name': 'process_name',
-                        'process_code': 'process_code',
-                        'purpose': 'purpose',
-                        'scope': 'scope'
-                    };
-
-                    for (const [metaKey, fieldId] of Object.entries(fieldMappings)) {
-                        if (metadata[metaKey]) {
-                            const field = document.getElementById(fieldId);
-                            if (field && !field.value.trim()) {
-                                field.value = metadata[metaKey];
-                                field.style.backgroundColor = '#e8f5e9';
-                                field.addEventListener('input', function() {
-                                    this.style.backgroundColor = '';
-                                }, { once: true });
-                            }
-                        }
-                    }
-
-                    // Abbreviations - only auto-fill if current entries are all empty
-                    if (metadata.abbreviations_list && metadata.abbreviations_list.length > 0) {
-                        const container = document.getElementById('abbreviations-container');
-                        const existingTerms = container.querySelectorAll('input[name="abbrev_term[]"]');
-                        const existingDefs = container.querySelectorAll('input[name="abbrev_def[]"]');
-
-                        let allEmpty = true;
-                        existingTerms.forEach((input, i) => {
-                            if (input.value.trim() || (existingDefs[i] && existingDefs[i].value.trim())) {
-                                allEmpty = false;
-                            }
-                        });
-
-                        if (allEmpty) {
-                            container.innerHTML = '';
-                            metadata.abbreviations_list.forEach(abbrev => {
-                                const entry = document.createElement('div');
-                                entry.className = 'abbrev-entry';
-                                entry.style.display = 'grid';
-                                entry.style.gridTemplateColumns = '1fr 2fr auto';
-                                entry.style.gap = '1em';
-                                entry.style.marginBottom = '1em';
-                                entry.innerHTML = `
-                                    <input type="text" name="abbrev_term[]" placeholder="Term" value="${escapeHtml(abbrev.term || '')}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; background-color: #e8f5e9;">
-                                    <input type="text" name="abbrev_def[]" placeholder="Definition" value="${escapeHtml(abbrev.definition || '')}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; background-color: #e8f5e9;">
-                                    <button type="button" onclick="removeAbbrev(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
-                                `;
-                                container.appendChild(entry);
-                            });
-                        }
-                    }
-
-                    // Referenced Documents & Approvals - auto-fill with lane approvals + DMG row
-                    if (metadata.lane_names && metadata.lane_names.length > 0) {
-                        const refsContainer = document.getElementById('references-container');
-                        const existingIds = refsContainer.querySelectorAll('input[name="ref_id[]"]');
-                        const existingTitles = refsContainer.querySelectorAll('input[name="ref_title[]"]');
-
-                        let refsAllEmpty = true;
-                        existingIds.forEach((input, i) => {
-                            if (input.value.trim() || (existingTitles[i] && existingTitles[i].value.trim())) {
-                                refsAllEmpty = false;
-                            }
-                        });
-
-                        if (refsAllEmpty) {
-                            refsContainer.innerHTML = '';
-
-                            // Add lane approval rows: N/A | {Lane Name} Approval
-                            metadata.lane_names.forEach(laneName => {
-                                const entry = document.createElement('div');
-                                entry.className = 'ref-entry';
-                                entry.style.display = 'grid';
-                                entry.style.gridTemplateColumns = '1fr 2fr auto';
-                                entry.style.gap = '1em';
-                                entry.style.marginBottom = '1em';
-                                entry.innerHTML = `
-                                    <input type="text" name="ref_id[]" placeholder="Document ID" value="N/A" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; background-color: #e8f5e9;">
-                                    <input type="text" name="ref_title[]" placeholder="Document Title" value="${escapeHtml(laneName)} Approval" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; background-color: #e8f5e9;">
-                                    <button type="button" onclick="removeRef(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
-                                `;
-                                refsContainer.appendChild(entry);
-                            });
-
-                            // Add DMG row: DMG-{process_code} | {process_name} Process Diagram        Notations Meaning
-                            const pCode = metadata.process_code || '';
-                            const pName = metadata.process_name || '';
-                            if (pCode || pName) {
-                                const dmgId = pCode ? 'DGM- ' + pCode : 'DGM-';
-                                const dmgTitle = pName + ' Process Diagram        Notations Meaning';
-                                const dmgEntry = document.createElement('div');
-                                dmgEntry.className = 'ref-entry';
-                                dmgEntry.style.display = 'grid';
-                                dmgEntry.style.gridTemplateColumns = '1fr 2fr auto';
-                                dmgEntry.style.gap = '1em';
-                                dmgEntry.style.marginBottom = '1em';
-                                dmgEntry.innerHTML = `
-                                    <input type="text" name="ref_id[]" placeholder="Document ID" value="${escapeHtml(dmgId)}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; background-color: #e8f5e9;">
-                                    <input type="text" name="ref_title[]" placeholder="Document Title" value="${escapeHtml(dmgTitle)}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; background-color: #e8f5e9;">
-                                    <button type="button" onclick="removeRef(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
-                                `;
-                                refsContainer.appendChild(dmgEntry);
-                            }
-                        }
-                    }
-
-                    // General Policies - auto-fill from BPMN
-                    if (metadata.general_policies_list && metadata.general_policies_list.length > 0) {
-                        const policiesContainer = document.getElementById('policies-container');
-                        const existingRefs = policiesContainer.querySelectorAll('input[name="policy_ref[]"]');
-                        const existingTexts = policiesContainer.querySelectorAll('input[name="policy_text[]"]');
-
-                        let policiesAllEmpty = true;
-                        existingRefs.forEach((input, i) => {
-                            if (input.value.trim() || (existingTexts[i] && existingTexts[i].value.trim())) {
-                                policiesAllEmpty = false;
-                            }
-                        });
-
-                        if (policiesAllEmpty) {
-                            policiesContainer.innerHTML = '';
-                            metadata.general_policies_list.forEach(policy => {
-                                const entry = document.createElement('div');
-                                entry.className = 'policy-entry';
-                                entry.style.display = 'grid';
-                                entry.style.gridTemplateColumns = '1fr 2fr auto';
-                                entry.style.gap = '1em';
-                                entry.style.marginBottom = '1em';
-                                entry.innerHTML = `
-                                    <input type="text" name="policy_ref[]" placeholder="Ref" value="${escapeHtml(policy.ref || '')}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; background-color: #e8f5e9;">
-                                    <input type="text" name="policy_text[]" placeholder="General Policy" value="${escapeHtml(policy.policy || '')}" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; background-color: #e8f5e9;">
-                                    <button type="button" onclick="removePolicy(this)" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>
-                                `;
-                                policiesContainer.appendChild(entry);
-                            });
-                        }
-                    }
-                }
-
-                // Auto-fill form from BPMN metadata when file is selected
-                document.getElementById('bpmn_file').addEventListener('change', async function(e) {
-                    const file = e.target.files[0];
-                    if (!file) return;
-
-                    const btn = document.getElementById('generate-btn');
-                    const originalText = btn.textContent;
-                    btn.textContent = 'Reading BPMN metadata...';
-                    btn.disabled = true;
-
-                    try {
-                        const formData = new FormData();
-                        formData.append('bpmn_file', file);
-
-                        const response = await fetch('/extract-metadata', {
-                            method: 'POST',
-                            body: formData
-                        });
-
-                        if (response.ok) {
-                            const data = await response.json();
-                            if (data.success && data.metadata) {
-                                resetFormFields();
-                                autoFillFromBpmn(data.metadata);
-                                // Auto-expand the metadata section so user can see filled fields
-                                const sections = document.getElementById('metadata-sections');
-                                if (sections.style.display === 'none') {
-                                    toggleMetadata();
-                                }
-                            }
-                        }
-                    } catch (error) {
-                        console.error('Error extracting BPMN metadata:', error);
-                    } finally {
-                        btn.textContent = originalText;
-                        btn.disabled = false;
-                    }
-                });
-
-                // Auto-fill form from BPMN metadata when XML is pasted
-                let xmlExtractTimer = null;
-                document.getElementById('xml_code').addEventListener('input', function() {
-                    // Debounce: wait 800ms after user stops typing/pasting
-                    clearTimeout(xmlExtractTimer);
-                    const xmlText = this.value.trim();
-                    if (!xmlText || xmlText.length < 50) return; // Too short to be valid BPMN
-                    xmlExtractTimer = setTimeout(async () => {
-                        const btn = document.getElementById('generate-btn');
-                        const originalText = btn.textContent;
-                        btn.textContent = 'Reading BPMN metadata...';
-                        btn.disabled = true;
-
-                        try {
-                            const formData = new FormData();
-                            formData.append('xml_code', xmlText);
-
-                            const response = await fetch('/extract-metadata', {
-                                method: 'POST',
-                                body: formData
-                            });
-
-                            if (response.ok) {
-                                const data = await response.json();
-                                if (data.success && data.metadata) {
-                                    resetFormFields();
-                                    autoFillFromBpmn(data.metadata);
-                                    const sections = document.getElementById('metadata-sections');
-                                    if (sections.style.display === 'none') {
-                                        toggleMetadata();
-                                    }
-                                }
-                            }
-                        } catch (error) {
-                            console.error('Error extracting BPMN metadata from XML:', error);
-                        } finally {
-                            btn.textContent = originalText;
-                            btn.disabled = false;
-                        }
-                    }, 800);
-                });
-
-            </script>
     </div>
 
     <!-- Archive Panel on Right -->
     <div class="archive-panel">
         <h3 style="margin-top: 0; color: #343a40; border-bottom: 1px solid #dee2e6; padding-bottom: 0.5em;">Backups</h3>
-        <select id="archive-select" onchange="onArchiveSelect()" style="width: 100%; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; font-size: 0.9em; background: white;">
+        <select id="archive-select" style="width: 100%; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px; font-size: 0.9em; background: white;">
             <option value="">-- Select a backup --</option>
         </select>
         <div id="archive-actions" style="display: none; margin-top: 1em; gap: 0.5em;">
@@ -1160,6 +438,43 @@ INDEX_HTML = r'''<!DOCTYPE html>
 </html>
 '''
 
+# --- Compiled page templates ---
+# Both pages are minified and compiled once at import time and reused for every
+# request; render_template_string would re-parse and recompile the source on
+# each call. Edits to PREVIEW_HTML / INDEX_HTML therefore need a server restart.
+_RE_PRESERVE_WHITESPACE = re.compile(r'(<(pre|textarea)\b.*?</\2>)', re.DOTALL | re.IGNORECASE)
+_RE_INDENT = re.compile(r'\n\s+')
+
+def minify_html(html):
+    """Drop line indentation and blank lines, leaving <pre>/<textarea> content untouched"""
+    parts = _RE_PRESERVE_WHITESPACE.split(html)
+    # split() yields [text, block, tag name, text, block, tag name, ...]
+    for i in range(0, len(parts), 3):
+        parts[i] = _RE_INDENT.sub('\n', parts[i])
+    return ''.join(part for i, part in enumerate(parts) if i % 3 != 2)
+
+PREVIEW_TEMPLATE = app.jinja_env.from_string(minify_html(PREVIEW_HTML))
+INDEX_TEMPLATE = app.jinja_env.from_string(minify_html(INDEX_HTML))
+
+GZIP_MIN_SIZE = 1024
+
+@functools.lru_cache(maxsize=1)
+def index_html():
+    """Render and compress the main page once; it has no per-request context.
+    Returns (utf-8 bytes, gzip bytes)."""
+    body = render_template(INDEX_TEMPLATE).encode('utf-8')
+    return body, gzip.compress(body, compresslevel=6)
+
+def html_response(html, compressed=None):
+    """Build an HTML response, gzip-compressed when the client accepts it.
+    Pass compressed to serve an already gzipped copy of html."""
+    response = make_response(html)
+    response.vary.add('Accept-Encoding')
+    if 'gzip' in request.accept_encodings and response.content_length >= GZIP_MIN_SIZE:
+        response.set_data(compressed if compressed is not None else gzip.compress(response.get_data(), compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 # --- App Data Directory (store runtime data in AppData, not exe folder) ---
 def get_app_data_dir():
     if os.name == 'nt':  # Windows
@@ -1178,51 +493,236 @@ history_manager = HistoryManager(os.path.join(APP_DATA_DIR, 'history'))
 # --- Archive Manager ---
 archive_manager = ArchiveManager(os.path.join(APP_DATA_DIR, 'archives'), os.path.join(APP_DATA_DIR, 'archive.db'))
 
+# --- Word template loading ---
+_PLACEHOLDER_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+_W_P = _qn('w:p')
+_W_T = _qn('w:t')
+_XML_SPACE = _qn('xml:space')
+
+def _merge_split_placeholders(ts):
+    """Merge placeholders Word has split over several runs (spell-check marks
+    and the like) into the run they start in, as docxtpl does"""
+    i = 0
+    while i < len(ts):
+        t = ts[i]
+        text = t.text or ''
+        if text.rfind('{{') > text.rfind('}}'):
+            j = i + 1
+            while j < len(ts) and '}}' not in text[text.rfind('{{'):]:
+                text += ts[j].text or ''
+                j += 1
+            run, end_run = t.getparent(), ts[j - 1].getparent()
+            # Only merge the simple case: sibling runs, tag ending in the end run's last text
+            if j > i + 1 and end_run.getparent() is run.getparent() and end_run.findall(_W_T)[-1] is ts[j - 1]:
+                while run.getnext() is not end_run:
+                    run.getparent().remove(run.getnext())
+                run.getparent().remove(end_run)
+                t.text = text
+                del ts[i + 1:j]
+        i += 1
+
+def fill_placeholders(root, context):
+    """Substitute {{name}} placeholders in every paragraph under root with
+    values from context; unknown names become empty"""
+    def value(match):
+        v = context.get(match.group(1))
+        return '' if v is None else str(v)
+
+    for p in root.iter(_W_P):
+        ts = list(p.iter(_W_T))
+        if not any('{{' in (t.text or '') for t in ts):
+            continue
+        _merge_split_placeholders(ts)
+        for t in ts:
+            if t.text and '{{' in t.text:
+                text = _PLACEHOLDER_RE.sub(value, t.text)
+                run = t.getparent()
+                if ('\n' in text or '\t' in text) and len(run.findall(_W_T)) == 1:
+                    # Let python-docx turn line breaks and tabs into <w:br/> / <w:tab/>
+                    Run(run, None).text = text
+                else:
+                    t.text = text
+                    t.set(_XML_SPACE, 'preserve')
+
+TEMPLATE_MAP = {
+    'sana': 'sana_template.docx',
+    'window_world': 'window_world_template.docx',
+    'tarabut': 'tarabut_template.docx',
+    'sabah': 'sabah_template.docx',
+}
+
+def template_file_for(template_name):
+    """The .docx behind a template name; unknown names get the master template"""
+    return TEMPLATE_MAP.get(template_name, 'final_master_template_2.docx')
+
+@functools.lru_cache(maxsize=8)
+def load_template_bytes(template_file):
+    """Read a bundled .docx template once; each render opens its own copy from memory"""
+    with open(resource_path(template_file), 'rb') as f:
+        return f.read()
+
 # --- Core Logic using our custom BPMN parser ---
-def parse_bpmn_to_context(xml_content, metadata):
+def parse_bpmn_to_context(xml_content, metadata, root=None):
     """
     Wrapper function that calls our comprehensive BPMN parser
     """
-    return parse_bpmn_to_sop(xml_content, metadata)
+    return parse_bpmn_to_sop(xml_content, metadata, root=root)
+
+def try_parse_bpmn_root(xml_content):
+    """Parse once for a request's metadata and SOP passes. On bad XML return
+    None, so each pass reports the error the way it always has."""
+    try:
+        return parse_bpmn_root(xml_content)
+    except Exception:
+        return None
 
 
-def create_word_doc_from_template(context, template_name='earthlink'):
+# Run formatting shared by the generated tables
+FONT_NAME = 'Avenir LT Std 45 Book'
+PT9, PT12, PT14 = Pt(9), Pt(12), Pt(14)
+RED = RGBColor(0xFF, 0, 0)
+BLACK = RGBColor(0, 0, 0)
+
+def apply_run_font(run, size, bold=None, color=None):
+    """Set the SOP font on a run; bold and color are left untouched when None"""
+    font = run.font
+    font.name = FONT_NAME
+    font.size = size
+    if bold is not None:
+        font.bold = bold
+    if color is not None:
+        font.color.rgb = color
+
+# Namespaced tag/attribute names for the cell shading and merge edits
+W_SHD = _qn('w:shd')
+W_FILL = _qn('w:fill')
+W_VAL = _qn('w:val')
+
+def set_cell_shading(tcPr, fill):
+    """Give a cell a solid fill, reusing its <w:shd> if it has one"""
+    shd = tcPr.find(W_SHD)
+    if shd is None:
+        shd = OxmlElement('w:shd')
+        tcPr.append(shd)
+    shd.set(W_FILL, fill)
+    shd.set(W_VAL, 'clear')
+
+# --- Process description rows as raw XML ---
+# Building the step rows through python-docx costs dozens of element lookups
+# per cell, so they are written as WordprocessingML strings instead. The markup
+# is what the python-docx calls produced (including the empty <w:r/> left by
+# cell.text = ''), so documents come out the same.
+_RUN_TEXT_SPLIT_RE = re.compile(r'([\t\r\n])')
+_STEP_ALIGNMENT = {'CENTER': 'center', 'JUSTIFY': 'both'}
+RACI_COLUMNS = ('responsible', 'accountable', 'consulted', 'informed')  # cells 2-5
+GATEWAY_FILL = 'D9D9D9'  # 15% darker gray
+
+def run_xml(text, size, bold=None, color=None):
+    """A <w:r> in the SOP font, with text split into <w:t>/<w:tab/>/<w:br/> like run.text does"""
+    rpr = f'<w:rFonts w:ascii="{FONT_NAME}" w:hAnsi="{FONT_NAME}"/>'
+    if bold is not None:
+        rpr += '<w:b/>' if bold else '<w:b w:val="0"/>'
+    if color is not None:
+        rpr += f'<w:color w:val="{color}"/>'
+    rpr += f'<w:sz w:val="{int(size.pt * 2)}"/>'
+    content = []
+    for piece in _RUN_TEXT_SPLIT_RE.split(text):
+        if piece == '\t':
+            content.append('<w:tab/>')
+        elif piece in ('\r', '\n'):
+            content.append('<w:br/>')
+        elif piece:
+            space = ' xml:space="preserve"' if len(piece.strip()) < len(piece) else ''
+            content.append(f'<w:t{space}>{xml_escape(piece)}</w:t>')
+    return f'<w:r><w:rPr>{rpr}</w:rPr>{"".join(content)}</w:r>'
+
+def _paragraph_xml(alignment, runs=''):
+    return f'<w:p><w:pPr><w:jc w:val="{alignment}"/></w:pPr>{runs}</w:p>'
+
+def _cell_xml(width, fill, content):
+    tcpr = ''
+    if width is not None:
+        tcpr += f'<w:tcW w:type="dxa" w:w="{width.twips}"/>'
+    if fill:
+        tcpr += f'<w:shd w:fill="{fill}" w:val="clear"/>'
+    return f'<w:tc>{f"<w:tcPr>{tcpr}</w:tcPr>" if tcpr else ""}{content}</w:tc>'
+
+def step_row_xml(step, widths):
+    """<w:tr> markup for one process step: Ref, description, R/A/C/I and the (blank) SLA cell"""
+    fill = GATEWAY_FILL if step.get('is_gateway', False) else None
+    raci = step.get('raci', {})
+    cells = [
+        # Ref number
+        _paragraph_xml('center', '<w:r/>' + (run_xml(step['ref'], PT14, bold=True, color=RED) if step['ref'] else '')),
+        # Process Description (multi-paragraph)
+        ''.join(_paragraph_xml(_STEP_ALIGNMENT.get(para['alignment'], 'left'),
+                               run_xml(para['text'], Pt(para['font_size']), bold=para['bold'], color=BLACK) if para['text'] else '')
+                for para in step['paragraphs']),
+    ]
+    # R, A, C, I columns - lane RACI values
+    cells += [_paragraph_xml('center', '<w:r/>' + run_xml(raci.get(key, 'N/A') or 'N/A', PT9)) for key in RACI_COLUMNS]
+    # SLA column - left blank, filled by the SLA merge pass
+    cells.append(_paragraph_xml('center', '<w:r/>' + run_xml('', PT9)))
+    row = ''.join(_cell_xml(width, fill if idx != 6 else None, cells[idx] if idx < len(cells) else '<w:p/>')
+                  for idx, width in enumerate(widths))
+    return f'<w:tr>{row}</w:tr>'
+
+def iter_sla_merges(steps):
+    """Yield (start, end, sla) ranges of steps whose SLA cells merge into one.
+
+    A task with an SLA takes in the gateway cases that follow it. A task in an
+    SLA group also takes in the next tasks of the same group and their gateway
+    cases. Gateway cases after a task without an SLA are skipped.
+    """
+    slas = [step.get('sla') for step in steps]
+    groups = [step.get('sla_group') for step in steps]
+    gateways = [step.get('is_gateway', False) for step in steps]
+    start = end = sla = group = None  # the open range
+    skipping = False  # inside the gateway cases of a task without an SLA
+    for i, is_gateway in enumerate(gateways):
+        if start is not None:
+            if is_gateway or (group and groups[i] == group):
+                end = i
+                continue
+            yield start, end, sla
+            start = None
+        elif skipping and is_gateway:
+            continue
+        skipping = False
+        if slas[i] or groups[i]:
+            start = end = i
+            sla, group = slas[i], groups[i]
+        else:
+            skipping = True
+    if start is not None:
+        yield start, end, sla
+
+def truncate_table_rows(table, keep):
+    """Remove every row of a python-docx table after the first `keep`, straight on the <w:tbl> element"""
+    tbl = table._tbl
+    for tr in tbl.tr_lst[keep:]:
+        tbl.remove(tr)
+
+def create_word_doc_from_template(context, template_name='earthlink', out=None):
     """
     Create Word document with multi-paragraph structure and precise formatting
     Following Guideline V2 specifications
+
+    The document is saved into out (a path or writable file) and out is
+    returned; without it a BytesIO is returned. None if generation failed.
     """
     try:
-        from docx import Document
-        from docx.shared import Pt, RGBColor
-        from docx.enum.text import WD_ALIGN_PARAGRAPH
-        from docx.oxml.ns import qn
-        from docx.oxml import OxmlElement
-
-        template_map = {
-            'sana': 'sana_template.docx',
-            'window_world': 'window_world_template.docx',
-            'tarabut': 'tarabut_template.docx',
-            'sabah': 'sabah_template.docx',
-        }
-        template_file = template_map.get(template_name, 'final_master_template_2.docx')
-        template_path = resource_path(template_file)
-
-        # First, render metadata using docxtpl (for any {{variables}} in headers/etc)
-        doc_template = DocxTemplate(template_path)
-
-        # Create a simple context for metadata rendering (excluding steps)
-        metadata_context = {k: v for k, v in context.items() if k != 'steps'}
-        doc_template.render(metadata_context)
-
-        # Now work with the rendered document using python-docx
-        # Save to memory and reload as Document for easier manipulation
-        temp_stream = io.BytesIO()
-        doc_template.save(temp_stream)
-        temp_stream.seek(0)
-        doc = Document(temp_stream)
-
-        # Get the tables
-        if not doc.tables:
+        template_file = template_file_for(template_name)
+
+        # Open the template and fill the metadata {{variables}} in place. The
+        # {%tr for step in steps %} rows are dropped below with the rest of the
+        # process table's template rows, so no template engine is needed.
+        doc = Document(io.BytesIO(load_template_bytes(template_file)))
+        fill_placeholders(doc.element.body, context)
+
+        # Get the tables - doc.tables walks the body on every access, so take it once
+        tables = doc.tables
+        if not tables:
             raise Exception("No tables found in template")
 
         # Fix font for all front matter tables to size 12
@@ -1233,25 +733,22 @@ def create_word_doc_from_template(context, template_name='earthlink'):
         # Table 4: Referenced Documents and Approvals
         # Table 5: Key Process Inputs/Outputs
         for table_idx in [0, 1, 2, 3, 4, 5]:
-            if len(doc.tables) > table_idx:
-                table = doc.tables[table_idx]
+            if len(tables) > table_idx:
+                table = tables[table_idx]
                 # Iterate through all cells in the table
                 for row in table.rows:
                     for cell in row.cells:
                         for paragraph in cell.paragraphs:
                             for run in paragraph.runs:
-                                run.font.name = 'Avenir LT Std 45 Book'
-                                run.font.size = Pt(12)
+                                apply_run_font(run, PT12)
 
         # Populate Table 4: Abbreviations and Definitions (index 3)
-        if len(doc.tables) > 3:
-            abbrev_table = doc.tables[3]
+        if len(tables) > 3:
+            abbrev_table = tables[3]
             abbreviations = context.get('abbreviations_list', [])
 
             # Clear existing rows (keep row 0=title and row 1=headers)
-            rows_to_delete = list(range(len(abbrev_table.rows) - 1, 1, -1))
-            for row_idx in rows_to_delete:
-                abbrev_table._element.remove(abbrev_table.rows[row_idx]._element)
+            truncate_table_rows(abbrev_table, 2)
 
             # Add rows for each abbreviation
             if abbreviations:
@@ -1263,11 +760,8 @@ def create_word_doc_from_template(context, template_name='earthlink'):
                     for idx, cell in enumerate(row.cells):
                         para = cell.paragraphs[0]
                         if para.runs:
-                            para.runs[0].font.name = 'Avenir LT Std 45 Book'
-                            para.runs[0].font.size = Pt(12)  # Changed from 11 to 12
-                            # Make Terms column (column 0) bold
-                            if idx == 0:
-                                para.runs[0].font.bold = True
+                            # Changed from 11 to 12; make Terms column (column 0) bold
+                            apply_run_font(para.runs[0], PT12, bold=True if idx == 0 else None)
             else:
                 # Add one empty row if no abbreviations provided
                 row = abbrev_table.add_row()
@@ -1277,18 +771,15 @@ def create_word_doc_from_template(context, template_name='earthlink'):
                 for cell in row.cells:
                     para = cell.paragraphs[0]
                     if para.runs:
-                        para.runs[0].font.name = 'Avenir LT Std 45 Book'
-                        para.runs[0].font.size = Pt(12)
+                        apply_run_font(para.runs[0], PT12)
 
         # Populate Table 5: Referenced Documents and Approvals (index 4)
-        if len(doc.tables) > 4:
-            ref_table = doc.tables[4]
+        if len(tables) > 4:
+            ref_table = tables[4]
             references = context.get('references_list', [])
 
             # Clear existing rows (keep row 0=title and row 1=headers)
-            rows_to_delete = list(range(len(ref_table.rows) - 1, 1, -1))
-            for row_idx in rows_to_delete:
-                ref_table._element.remove(ref_table.rows[row_idx]._element)
+            truncate_table_rows(ref_table, 2)
 
             # Add rows for each reference
             if references:
@@ -1300,11 +791,8 @@ def create_word_doc_from_template(context, template_name='earthlink'):
                     for idx, cell in enumerate(row.cells):
                         para = cell.paragraphs[0]
                         if para.runs:
-                            para.runs[0].font.name = 'Avenir LT Std 45 Book'
-                            para.runs[0].font.size = Pt(12)  # Changed from 11 to 12
-                            # Make Document ID column (column 0) bold
-                            if idx == 0:
-                                para.runs[0].font.bold = True
+                            # Changed from 11 to 12; make Document ID column (column 0) bold
+                            apply_run_font(para.runs[0], PT12, bold=True if idx == 0 else None)
             else:
                 # Add one empty row if no references provided
                 row = ref_table.add_row()
@@ -1314,173 +802,44 @@ def create_word_doc_from_template(context, template_name='earthlink'):
                 for cell in row.cells:
                     para = cell.paragraphs[0]
                     if para.runs:
-                        para.runs[0].font.name = 'Avenir LT Std 45 Book'
-                        para.runs[0].font.size = Pt(12)
+                        apply_run_font(para.runs[0], PT12)
 
         # Get the process description table (Table 6 - Table 7 is General Policies)
-        table = doc.tables[6]
+        table = tables[6]
 
         # Clear all rows except header (row 0)
-        rows_to_delete = list(range(len(table.rows) - 1, 0, -1))  # Delete in reverse order
-        for row_idx in rows_to_delete:
-            table._element.remove(table.rows[row_idx]._element)
+        truncate_table_rows(table, 1)
 
         # Now add rows for each step with proper formatting
         steps = context.get('steps', [])
 
-        for step in steps:
-            # Add new row
-            new_row = table.add_row()
-            cells = new_row.cells
-
-            # --- Cell 0: Ref number ---
-            ref_cell = cells[0]
-            ref_cell.text = ''  # Clear any existing text
-            ref_para = ref_cell.paragraphs[0]
-            ref_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-            if step['ref']:  # Only add ref if it exists
-                run = ref_para.add_run(step['ref'])
-                run.font.name = 'Avenir LT Std 45 Book'
-                run.font.size = Pt(14)
-                run.font.bold = True
-                run.font.color.rgb = RGBColor(255, 0, 0)  # RED
-
-            # --- Cell 1: Process Description (multi-paragraph) ---
-            desc_cell = cells[1]
-            desc_cell.text = ''  # Clear any existing text
-
-            # Remove default paragraph
-            if desc_cell.paragraphs:
-                p = desc_cell.paragraphs[0]
-                p._element.getparent().remove(p._element)
-
-            # Add each paragraph with specific formatting
-            for para_data in step['paragraphs']:
-                para = desc_cell.add_paragraph()
-
-                # Set alignment
-                if para_data['alignment'] == 'CENTER':
-                    para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                elif para_data['alignment'] == 'JUSTIFY':
-                    para.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                else:
-                    para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-                # Add text with formatting
-                if para_data['text']:  # Only add run if there's text
-                    run = para.add_run(para_data['text'])
-                    run.font.name = 'Avenir LT Std 45 Book'
-                    run.font.size = Pt(para_data['font_size'])
-                    run.font.bold = para_data['bold']
-                    run.font.color.rgb = RGBColor(0, 0, 0)  # Black
-
-            # --- Cells 2-6: RACI + SLA ---
-            # All RACI fields must be Avenir LT Std 45 Book font size 9
-            raci = step.get('raci', {})
-            raci_map = {2: 'responsible', 3: 'accountable', 4: 'consulted', 5: 'informed'}
-            for i in range(2, 7):
-                # Clear cell and get paragraph
-                cells[i].text = ''
-                para = cells[i].paragraphs[0]
-                para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-                # Set paragraph style font (this ensures the cell has the right font even when empty)
-                para.style.font.name = 'Avenir LT Std 45 Book'
-                para.style.font.size = Pt(9)
-
-                if i == 6:  # SLA column - leave blank (handled by SLA merge logic)
-                    run = para.add_run('')
-                    run.font.name = 'Avenir LT Std 45 Book'
-                    run.font.size = Pt(9)
-                elif i in raci_map:  # R, A, C, I columns - use lane RACI values
-                    value = raci.get(raci_map[i], 'N/A') or 'N/A'
-                    run = para.add_run(value)
-                    run.font.name = 'Avenir LT Std 45 Book'
-                    run.font.size = Pt(9)
-
-            # --- Apply gateway shading if needed ---
-            if step.get('is_gateway', False):
-                for cell_idx, cell in enumerate(new_row.cells):
-                    if cell_idx == 6:
-                        continue  # Skip SLA column - handled separately
-                    tcPr = cell._element.get_or_add_tcPr()
-                    # Remove existing shading
-                    for shd in tcPr.findall(qn('w:shd')):
-                        tcPr.remove(shd)
-                    # Apply D9D9D9 shading
-                    shd = OxmlElement('w:shd')
-                    shd.set(qn('w:fill'), 'D9D9D9')  # 15% darker gray
-                    shd.set(qn('w:val'), 'clear')
-                    tcPr.append(shd)
+        if steps:
+            # The RACI/SLA paragraphs use the default paragraph style; give it the table font
+            style = doc.part.get_style(None, WD_STYLE_TYPE.PARAGRAPH)
+            style.font.name = FONT_NAME
+            style.font.size = PT9
 
-        # --- SLA shading and vertical merging ---
-        # Compute merge ranges: (start_step_idx, end_step_idx, sla_value)
-        sla_merges = []
-        idx = 0
-        while idx < len(steps):
-            step_item = steps[idx]
-            sla = step_item.get('sla')
-            sla_group = step_item.get('sla_group')
-
-            if sla and not sla_group:
-                # Task with own SLA - include following gateway cases
-                merge_start = idx
-                merge_end = idx
-                j = idx + 1
-                while j < len(steps) and steps[j].get('is_gateway', False):
-                    merge_end = j
-                    j += 1
-                sla_merges.append((merge_start, merge_end, sla))
-                idx = j
-            elif sla_group:
-                # Task in SLA group - include all group members + their gateway cases
-                merge_start = idx
-                merge_end = idx
-                group_sla = sla
-                j = idx + 1
-                # Include gateway cases of this task
-                while j < len(steps) and steps[j].get('is_gateway', False):
-                    merge_end = j
-                    j += 1
-                # Continue with next tasks in same group
-                while j < len(steps) and steps[j].get('sla_group') == sla_group:
-                    merge_end = j
-                    j += 1
-                    # Include their gateway cases too
-                    while j < len(steps) and steps[j].get('is_gateway', False):
-                        merge_end = j
-                        j += 1
-                sla_merges.append((merge_start, merge_end, group_sla))
-                idx = j
-            else:
-                # No SLA - skip this step and any following gateway cases
-                idx += 1
-                while idx < len(steps) and steps[idx].get('is_gateway', False):
-                    idx += 1
+        # Build every step row as one XML string and parse it in a single go
+        widths = [gridCol.w for gridCol in table._tbl.tblGrid.gridCol_lst]
+        step_trs = list(parse_xml(f'<w:tbl {nsdecls("w")}>{"".join(step_row_xml(step, widths) for step in steps)}</w:tbl>'))
+        table._tbl.extend(step_trs)
 
-        # Apply SLA shading and vertical merge
-        for merge_start, merge_end, sla_value in sla_merges:
+        # --- SLA shading and vertical merging ---
+        def apply_sla_merge(merge_start, merge_end, sla_value):
+            """Shade and vertically merge the SLA cells of steps merge_start..merge_end"""
             for row_offset in range(merge_start, merge_end + 1):
-                table_row_idx = row_offset + 1  # Row 0 is header
-                if table_row_idx >= len(table.rows):
-                    break
-                sla_cell = table.rows[table_row_idx].cells[6]
+                # Step rows are in step_trs, so no need to go back through table.rows
+                sla_cell = _Cell(step_trs[row_offset].tc_lst[6], table)
                 tcPr = sla_cell._element.get_or_add_tcPr()
 
                 # Apply F2F2F2 shading (White, Background 1, Darker 5%)
-                for existing_shd in tcPr.findall(qn('w:shd')):
-                    tcPr.remove(existing_shd)
-                shd_elem = OxmlElement('w:shd')
-                shd_elem.set(qn('w:fill'), 'F2F2F2')
-                shd_elem.set(qn('w:val'), 'clear')
-                tcPr.append(shd_elem)
+                set_cell_shading(tcPr, 'F2F2F2')
 
                 # Vertical merge if multiple rows in range
                 if merge_end > merge_start:
                     vMerge = OxmlElement('w:vMerge')
                     if row_offset == merge_start:
-                        vMerge.set(qn('w:val'), 'restart')
+                        vMerge.set(W_VAL, 'restart')
                     tcPr.append(vMerge)
 
                 # Write SLA value only in first row of merge
@@ -1489,15 +848,17 @@ def create_word_doc_from_template(context, template_name='earthlink'):
                     if p.runs:
                         p.runs[0].text = sla_value
 
+        # Merge ranges are applied as the scan finds them
+        for merge_start, merge_end, sla_value in iter_sla_merges(steps):
+            apply_sla_merge(merge_start, merge_end, sla_value)
+
         # --- Populate Table 7: General Policies ---
-        if len(doc.tables) > 7:
-            policies_table = doc.tables[7]
+        if len(tables) > 7:
+            policies_table = tables[7]
             policies = context.get('general_policies_list', [])
 
             # Clear existing data rows (keep row 0=headers only)
-            rows_to_delete = list(range(len(policies_table.rows) - 1, 0, -1))
-            for row_idx in rows_to_delete:
-                policies_table._element.remove(policies_table.rows[row_idx]._element)
+            truncate_table_rows(policies_table, 1)
 
             if policies:
                 for idx, policy in enumerate(policies, start=1):
@@ -1508,18 +869,13 @@ def create_word_doc_from_template(context, template_name='earthlink'):
                     ref_para = ref_cell.paragraphs[0]
                     ref_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
                     run = ref_para.add_run(str(idx))
-                    run.font.name = 'Avenir LT Std 45 Book'
-                    run.font.size = Pt(14)
-                    run.font.bold = True
-                    run.font.color.rgb = RGBColor(255, 0, 0)
+                    apply_run_font(run, PT14, bold=True, color=RED)
                     # Policy text column: Avenir, 12, bold
                     text_cell = row.cells[1]
                     text_cell.text = ''
                     text_para = text_cell.paragraphs[0]
                     run = text_para.add_run(policy.get('policy', ''))
-                    run.font.name = 'Avenir LT Std 45 Book'
-                    run.font.size = Pt(12)
-                    run.font.bold = True
+                    apply_run_font(run, PT12, bold=True)
             else:
                 row = policies_table.add_row()
                 # N/A ref cell
@@ -1528,18 +884,17 @@ def create_word_doc_from_template(context, template_name='earthlink'):
                 ref_para = ref_cell.paragraphs[0]
                 ref_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
                 run = ref_para.add_run('N/A')
-                run.font.name = 'Avenir LT Std 45 Book'
-                run.font.size = Pt(14)
-                run.font.bold = True
-                run.font.color.rgb = RGBColor(255, 0, 0)
+                apply_run_font(run, PT14, bold=True, color=RED)
                 # N/A policy text cell
                 text_cell = row.cells[1]
                 text_cell.text = ''
                 text_para = text_cell.paragraphs[0]
                 run = text_para.add_run('N/A')
-                run.font.name = 'Avenir LT Std 45 Book'
-                run.font.size = Pt(12)
-                run.font.bold = True
+                apply_run_font(run, PT12, bold=True)
+
+        if out is not None:
+            doc.save(out)
+            return out
 
         # Save to BytesIO
         file_stream = io.BytesIO()
@@ -1547,23 +902,249 @@ def create_word_doc_from_template(context, template_name='earthlink'):
         file_stream.seek(0)
         return file_stream
 
-    except Exception as e:
-        print(f"[ERROR] Word Doc Generation Failed: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        log.exception("Word Doc Generation Failed")
         return None
 
+# --- Document rendering in worker processes ---
+# Building the document is CPU-bound python-docx work, so concurrent requests
+# would serialise on the GIL if it ran in the Waitress threads. It runs in a
+# small process pool instead; SOP_RENDER_WORKERS=0 renders in-process.
+RENDER_WORKERS = int(os.environ.get('SOP_RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def _render_docx_file(context, template_name, path):
+    """Worker entry point - saves the document straight to path, so its bytes
+    never have to be pickled back to the server process"""
+    return create_word_doc_from_template(context, template_name=template_name, out=path) is not None
+
+def _get_render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # spawn everywhere: forking a threaded server is unsafe, and it's what Windows uses anyway
+            _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS,
+                                               mp_context=multiprocessing.get_context('spawn'))
+        return _render_pool
+
+def warm_render_pool():
+    """Start a worker ahead of the first request so it doesn't pay the process start-up"""
+    if RENDER_WORKERS > 0:
+        _get_render_pool().submit(int)
+
+def render_docx(context, path, template_name='earthlink'):
+    """Render the SOP document into the file at path, in the worker pool when enabled.
+    Returns True on success."""
+    global _render_pool
+    if RENDER_WORKERS > 0:
+        try:
+            return _get_render_pool().submit(_render_docx_file, context, template_name, path).result()
+        except BrokenProcessPool:
+            log.exception("Render worker died, rendering in-process")
+            with _render_pool_lock:
+                _render_pool = None
+        except Exception:
+            log.exception("Render worker failed, rendering in-process")
+    return _render_docx_file(context, template_name, path)
+
+# --- Rendered document cache ---
+# Regenerating the same BPMN with the same metadata and template gives the same
+# document, so finished .docx files are kept on disk keyed by a content hash.
+# The cache outlives the process, so the key also covers the template file's
+# contents and the code that builds the document (source files, or the built
+# executable) - an upgrade or a replaced template never serves an old render.
+# RENDER_CACHE_VERSION remains for forcing a reset by hand.
+RENDER_CACHE_VERSION = 2
+RENDER_CACHE_DIR = os.path.join(APP_DATA_DIR, 'cache')
+RENDER_CACHE_MAX_FILES = 100
+os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+
+@functools.lru_cache(maxsize=None)
+def _render_code_version():
+    """Fingerprint of the code that shapes the document"""
+    h = hashlib.sha256(f"python-docx {getattr(docx, '__version__', '')}|".encode('utf-8'))
+    if _FROM_SOURCE:
+        for path in (__file__, sys.modules[parse_bpmn_to_sop.__module__].__file__):
+            with open(path, 'rb') as f:
+                h.update(f.read())
+    else:
+        # Frozen build: a new build is a new executable
+        exe = sys.argv[0] if _IS_NUITKA else sys.executable
+        st = os.stat(exe)
+        h.update(f"{st.st_size}|{st.st_mtime_ns}".encode('utf-8'))
+    return h.hexdigest()
+
+@functools.lru_cache(maxsize=8)
+def _template_digest(template_file):
+    return hashlib.sha256(load_template_bytes(template_file)).hexdigest()
+
+# Form fields /generate leaves in its metadata that don't affect the document;
+# xml_code is the BPMN itself, which is hashed separately
+RENDER_CACHE_IGNORED_FIELDS = frozenset({'xml_code', 'input_type'})
+
+def render_cache_key(template_name, metadata, bpmn_content):
+    """sha256 over code version, template (name and file contents), metadata
+    (canonical JSON) and the BPMN bytes or stream"""
+    h = hashlib.sha256(f"v{RENDER_CACHE_VERSION}|{_render_code_version()}|{template_name}|"
+                       f"{_template_digest(template_file_for(template_name))}|".encode('utf-8'))
+    keyed = {k: v for k, v in metadata.items() if k not in RENDER_CACHE_IGNORED_FIELDS}
+    h.update(json.dumps(keyed, sort_keys=True, default=str).encode('utf-8'))
+    if hasattr(bpmn_content, 'read'):
+        bpmn_content.seek(0)
+        for chunk in iter(lambda: bpmn_content.read(65536), b''):
+            h.update(chunk)
+    else:
+        h.update(bpmn_content)
+    return h.hexdigest()
+
+def _prune_render_cache():
+    """Keep only the most recently used RENDER_CACHE_MAX_FILES documents"""
+    with os.scandir(RENDER_CACHE_DIR) as it:
+        entries = [e for e in it if e.name.endswith('.docx')]
+    if len(entries) <= RENDER_CACHE_MAX_FILES:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[:len(entries) - RENDER_CACHE_MAX_FILES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass  # Still being sent (Windows) - it goes next time
+
+def generate_docx(bpmn_content, metadata, template_name='earthlink', root=None):
+    """Parse the BPMN (unless root is given) and render the SOP, reusing a cached
+    copy when possible. Returns the path of the finished .docx, or None if
+    rendering failed."""
+    cache_path = os.path.join(RENDER_CACHE_DIR, render_cache_key(template_name, metadata, bpmn_content) + '.docx')
+    if os.path.exists(cache_path):
+        try:
+            os.utime(cache_path)  # Mark as recently used for pruning
+        except OSError:
+            pass
+        return cache_path
+
+    context = parse_bpmn_to_context(bpmn_content, metadata, root=root)
+
+    # Render under a temp name and rename, so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=RENDER_CACHE_DIR)
+    os.close(fd)  # The renderer (possibly another process) opens it itself
+    try:
+        if not render_docx(context, tmp_path, template_name=template_name):
+            return None
+        try:
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # An identical concurrent request got there first and its copy is still
+            # open for sending (Windows won't replace it) - serve that one instead
+            if not os.path.exists(cache_path):
+                raise
+    finally:
+        # Already renamed on success; left over after a failed or raising render
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    _prune_render_cache()
+    return cache_path
+
+def clear_render_cache():
+    removed = 0
+    with os.scandir(RENDER_CACHE_DIR) as it:
+        for entry in it:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+def send_docx(docx_path, output_name):
+    """Send a generated document as an attachment, streamed from disk"""
+    return send_file(docx_path, as_attachment=True, download_name=f"{output_name}.docx",
+                     mimetype=DOCX_MIMETYPE, conditional=True)
+
+def revalidated_json(data):
+    """JSON response tagged with a content ETag; a matching If-None-Match gets a 304"""
+    response = jsonify(data)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# Endpoints the Camunda Modeler plugin calls from its own origin. Only these are
+# opened up - the rest of the API (history, archives) stays same-origin.
+CORS_ENDPOINTS = frozenset({'api_generate_from_xml', 'api_upload_xml', 'api_generate_and_download'})
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    # The plugin names the saved file from the attachment header
+    'Access-Control-Expose-Headers': 'Content-Disposition',
+}
+CORS_PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+
+@app.after_request
+def add_cors_headers(response):
+    """CORS headers for the plugin endpoints, on every response including errors.
+    Preflights are Flask's automatic OPTIONS responses for those routes."""
+    if request.endpoint in CORS_ENDPOINTS:
+        response.headers.update(CORS_HEADERS)
+        if request.method == 'OPTIONS':
+            response.headers.update(CORS_PREFLIGHT_HEADERS)
+    return response
+
+@app.route('/api/cache/clear', methods=['POST'])
+def api_clear_cache():
+    """Drop all cached rendered documents"""
+    return jsonify({'success': True, 'removed': clear_render_cache()})
+
+@app.errorhandler(413)
+def request_too_large(e):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'Request too large (limit is {limit_mb} MB)'}), 413
+
 @app.route('/')
 def index():
     try:
         debug_log(f"index() called, template_folder={app.template_folder}")
-        return render_template_string(INDEX_HTML)
+        return html_response(*index_html())
     except Exception as e:
-        import traceback
         debug_log(f"index() ERROR: {e}")
         debug_log(traceback.format_exc())
         raise
 
+# --- /extract-metadata coalescing ---
+# A paste and a file change can fire overlapping requests for the same XML.
+# Identical requests share one parse: the first submits it, later ones wait on
+# its future. Finished futures are kept briefly so a trailing duplicate is free.
+METADATA_RESULT_TTL = 5  # seconds
+_metadata_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='metadata')
+_metadata_futures = {}
+_metadata_futures_lock = threading.Lock()
+
+def _forget_metadata_future(key, future):
+    with _metadata_futures_lock:
+        if _metadata_futures.get(key) is future:
+            del _metadata_futures[key]
+
+def _schedule_forget_metadata(key, future):
+    timer = threading.Timer(METADATA_RESULT_TTL, _forget_metadata_future, (key, future))
+    timer.daemon = True  # don't hold up shutdown
+    timer.start()
+
+def extract_metadata_coalesced(bpmn_content):
+    """extract_metadata_from_bpmn() for bytes, sharing the work between identical concurrent requests"""
+    key = hashlib.blake2b(bpmn_content, digest_size=16).digest()
+    with _metadata_futures_lock:
+        future = _metadata_futures.get(key)
+        if future is None:
+            future = _metadata_pool.submit(extract_metadata_from_bpmn, bpmn_content)
+            _metadata_futures[key] = future
+            future.add_done_callback(lambda f: _schedule_forget_metadata(key, f))
+    return future.result(timeout=30)
+
 @app.route('/extract-metadata', methods=['POST'])
 def extract_metadata():
     """Extract metadata from uploaded BPMN file or pasted XML for form auto-population"""
@@ -1585,7 +1166,7 @@ def extract_metadata():
         return jsonify({'error': 'No BPMN content provided'}), 400
 
     try:
-        metadata = extract_metadata_from_bpmn(bpmn_content)
+        metadata = extract_metadata_coalesced(bpmn_content)
         return jsonify({'success': True, 'metadata': metadata})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1595,7 +1176,7 @@ def get_history():
     """Get all history entries"""
     history_manager.set_user('local')
     history = history_manager.get_all()
-    return jsonify(history)
+    return revalidated_json(history)
 
 @app.route('/api/history/<int:index>', methods=['GET'])
 def get_history_entry(index):
@@ -1608,6 +1189,8 @@ def get_history_entry(index):
 
 # --- Archive API Endpoints ---
 
+_USER_ID_RE = re.compile(r'\A[a-zA-Z0-9_]+\Z')  # \Z, unlike $, doesn't also match before a trailing newline
+
 @app.route('/api/user/set', methods=['POST'])
 def set_user():
     """Set current user ID in session"""
@@ -1618,7 +1201,7 @@ def set_user():
         return jsonify({'error': 'User ID required'}), 400
 
     # Simple validation - alphanumeric and underscores only
-    if not re.match(r'^[a-zA-Z0-9_]+$', user_id):
+    if not _USER_ID_RE.match(user_id):
         return jsonify({'error': 'User ID can only contain letters, numbers, and underscores'}), 400
 
     session['user_id'] = user_id
@@ -1648,23 +1231,13 @@ def save_archive():
     if bpmn_file.filename == '' or docx_file.filename == '':
         return jsonify({'error': 'Empty file names'}), 400
 
-    # Save files temporarily
-    import tempfile
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.bpmn') as tmp_bpmn:
-        bpmn_file.save(tmp_bpmn.name)
-        bpmn_temp_path = tmp_bpmn.name
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp_docx:
-        docx_file.save(tmp_docx.name)
-        docx_temp_path = tmp_docx.name
-
     try:
-        # Save to archive
+        # Save to archive (the uploads stream straight into the archive folder)
         archive_id = archive_manager.save_archive(
             user_id=user_id,
             process_name=process_name,
-            bpmn_file_path=bpmn_temp_path,
-            docx_file_path=docx_temp_path
+            bpmn_file_path=bpmn_file,
+            docx_file_path=docx_file
         )
 
         return jsonify({
@@ -1674,19 +1247,93 @@ def save_archive():
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        # Clean up temp files
-        try:
-            os.remove(bpmn_temp_path)
-            os.remove(docx_temp_path)
-        except:
-            pass
 
 @app.route('/api/archive/list', methods=['GET'])
 def list_archives():
     """Get all archives"""
     archives = archive_manager.get_user_archives('local')
-    return jsonify({'archives': archives})
+    return revalidated_json({'archives': archives})
+
+# --- Native save dialog ---
+# The desktop app asks its pywebview window, which runs the dialog on the UI
+# thread. Without a window (sop_server.py) fall back to Tk: Tk objects belong
+# to the thread that created them and waitress runs each request on whichever
+# worker thread is free, so one hidden root lives on its own thread and
+# request threads queue their dialogs to it.
+
+# Set by main() once the window exists
+webview_window = None
+
+_dialog_requests = queue.Queue()
+_dialog_thread = None
+_dialog_thread_lock = threading.Lock()
+DIALOG_POLL_MS = 50
+
+def _dialog_loop():
+    import tkinter as tk
+    from tkinter import filedialog
+
+    try:
+        root = tk.Tk()
+        root.withdraw()
+        root.attributes('-topmost', True)
+    except Exception as e:
+        # No display (or no Tk): fail each dialog rather than hang its request
+        while True:
+            _, reply = _dialog_requests.get()
+            reply.put(e)
+
+    def poll():
+        while True:
+            try:
+                options, reply = _dialog_requests.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                reply.put(filedialog.asksaveasfilename(parent=root, **options))
+            except Exception as e:
+                reply.put(e)
+        root.after(DIALOG_POLL_MS, poll)
+
+    poll()
+    root.mainloop()
+
+def start_dialog_thread():
+    """Start the Tk thread (once)"""
+    global _dialog_thread
+    with _dialog_thread_lock:
+        if _dialog_thread is None:
+            _dialog_thread = threading.Thread(target=_dialog_loop, daemon=True)
+            _dialog_thread.start()
+
+def ask_save_path(initialfile, type_name, extension):
+    """Show a save-as dialog and block the calling request until the user picks
+    a path (returned) or cancels (empty string)."""
+    if webview_window is not None:
+        import webview
+        result = webview_window.create_file_dialog(
+            webview.SAVE_DIALOG,
+            save_filename=initialfile,
+            file_types=(f'{type_name} (*{extension})',)
+        )
+        # Some backends hand back a one-element tuple
+        if isinstance(result, (tuple, list)):
+            result = result[0] if result else None
+        if result and not result.lower().endswith(extension):
+            result += extension
+        return result or ''
+
+    start_dialog_thread()
+    reply = queue.Queue(maxsize=1)
+    _dialog_requests.put(({
+        'defaultextension': extension,
+        'filetypes': [(type_name, '*' + extension)],
+        'initialfile': initialfile,
+    }, reply))
+    result = reply.get()
+    if isinstance(result, Exception):
+        raise result
+    return result
 
 @app.route('/api/archive/<int:archive_id>/bpmn', methods=['GET'])
 def download_archive_bpmn(archive_id):
@@ -1699,23 +1346,15 @@ def download_archive_bpmn(archive_id):
     if not bpmn_path:
         return jsonify({'error': 'BPMN file not found'}), 404
 
+    # Browsers download the bytes directly; the desktop window uses the save dialog below
+    if request.args.get('download') == '1':
+        return send_file(bpmn_path, as_attachment=True, download_name=f"{archive['process_name']}.bpmn",
+                         mimetype='application/xml', conditional=True)
+
     # Use save dialog for download
-    import tkinter as tk
-    from tkinter import filedialog
-    root = tk.Tk()
-    root.withdraw()
-    root.attributes('-topmost', True)
-    save_path = filedialog.asksaveasfilename(
-        parent=root,
-        defaultextension='.bpmn',
-        filetypes=[('BPMN File', '*.bpmn')],
-        initialfile=archive['bpmn_filename'],
-        title='Save BPMN File'
-    )
-    root.destroy()
+    save_path = ask_save_path(archive['bpmn_filename'], 'BPMN File', '.bpmn')
 
     if save_path:
-        import shutil
         shutil.copy(bpmn_path, save_path)
         return jsonify({'success': True, 'path': save_path})
     return jsonify({'success': False, 'message': 'Cancelled'})
@@ -1731,23 +1370,15 @@ def download_archive_docx(archive_id):
     if not docx_path:
         return jsonify({'error': 'Word file not found'}), 404
 
+    # Browsers download the bytes directly; the desktop window uses the save dialog below
+    if request.args.get('download') == '1':
+        return send_file(docx_path, as_attachment=True, download_name=f"{archive['process_name']}.docx",
+                         mimetype=DOCX_MIMETYPE, conditional=True)
+
     # Use save dialog for download
-    import tkinter as tk
-    from tkinter import filedialog
-    root = tk.Tk()
-    root.withdraw()
-    root.attributes('-topmost', True)
-    save_path = filedialog.asksaveasfilename(
-        parent=root,
-        defaultextension='.docx',
-        filetypes=[('Word Document', '*.docx')],
-        initialfile=archive['docx_filename'],
-        title='Save Word Document'
-    )
-    root.destroy()
+    save_path = ask_save_path(archive['docx_filename'], 'Word Document', '.docx')
 
     if save_path:
-        import shutil
         shutil.copy(docx_path, save_path)
         return jsonify({'success': True, 'path': save_path})
     return jsonify({'success': False, 'message': 'Cancelled'})
@@ -1769,12 +1400,16 @@ def api_generate_from_xml():
             return jsonify({'error': 'No XML provided'}), 400
 
         bpmn_content = data['xml'].encode('utf-8')
-        metadata = data.get('metadata', {})
+        # The plugin may send null for either; treat that as not provided
+        metadata = data.get('metadata') or {}
+        template_name = data.get('template') or 'earthlink'
+        root = try_parse_bpmn_root(bpmn_content)
 
         # Extract BPMN metadata for fields not provided
-        bpmn_metadata = extract_metadata_from_bpmn(bpmn_content)
-        for field in ['process_name', 'process_code', 'purpose', 'scope']:
-            if not metadata.get(field, '').strip() and field in bpmn_metadata:
+        bpmn_metadata = extract_metadata_from_bpmn(bpmn_content, root=root)
+        get = metadata.get
+        for field in ('process_name', 'process_code', 'purpose', 'scope'):
+            if not (get(field) or '').strip() and field in bpmn_metadata:
                 metadata[field] = bpmn_metadata[field]
 
         # Auto-populate abbreviations if not provided
@@ -1799,116 +1434,143 @@ def api_generate_from_xml():
         if 'general_policies_list' not in metadata:
             metadata['general_policies_list'] = bpmn_metadata.get('general_policies_list', [])
 
-        # Get template selection
-        template_name = data.get('template', 'earthlink')
-
-        context = parse_bpmn_to_context(bpmn_content, metadata)
-        file_stream = create_word_doc_from_template(context, template_name=template_name)
+        docx_path = generate_docx(bpmn_content, metadata, template_name=template_name, root=root)
 
-        if not file_stream:
+        if not docx_path:
             return jsonify({'error': 'Failed to generate document'}), 500
 
-        file_stream.seek(0)
         output_name = metadata.get('process_name', bpmn_metadata.get('process_name', 'SOP_Document'))
-        response = make_response(file_stream.read())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        response.headers['Content-Disposition'] = f'attachment; filename="{output_name}.docx"'
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        return response
+        return send_docx(docx_path, output_name)
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception("Generate from XML failed")
         return jsonify({'error': str(e)}), 500
 
-import uuid as _uuid
-_preview_sessions = {}
+# Previews the Modeler plugin opened but never downloaded would otherwise pile
+# up forever, so keep at most MAX_PREVIEW_SESSIONS holding at most
+# MAX_PREVIEW_SESSION_BYTES of XML between them, each for SESSION_TTL_SEC.
+# Sessions keep only the XML bytes; parse_bpmn_root() reuses the parse where
+# it is small enough to cache.
+MAX_PREVIEW_SESSIONS = 128
+MAX_PREVIEW_SESSION_BYTES = 64 * 1024 * 1024
+SESSION_TTL_SEC = 3600
+SESSION_REAP_INTERVAL = 60  # seconds
+_preview_sessions = OrderedDict()  # session_id -> (created, data, XML size), oldest first
+_preview_sessions_bytes = 0
+_preview_sessions_lock = threading.Lock()
+_preview_reaper = None
+
+def _pop_preview_session(session_id=None):
+    """Remove a session (the oldest without session_id) and return its entry
+    (caller holds the lock)"""
+    global _preview_sessions_bytes
+    if session_id is None:
+        _, entry = _preview_sessions.popitem(last=False)
+    else:
+        entry = _preview_sessions.pop(session_id, None)
+        if entry is None:
+            return None
+    _preview_sessions_bytes -= entry[2]
+    return entry
+
+def _expire_preview_sessions(now):
+    """Drop sessions past their TTL (caller holds the lock)"""
+    while _preview_sessions:
+        created = next(iter(_preview_sessions.values()))[0]
+        if now - created < SESSION_TTL_SEC:
+            break
+        _pop_preview_session()
+
+def _reap_preview_sessions():
+    while True:
+        time.sleep(SESSION_REAP_INTERVAL)
+        with _preview_sessions_lock:
+            _expire_preview_sessions(time.monotonic())
+
+def store_preview_session(session_id, data):
+    global _preview_reaper, _preview_sessions_bytes
+    now = time.monotonic()
+    size = len(data['xml_bytes'])
+    with _preview_sessions_lock:
+        _pop_preview_session(session_id)
+        _preview_sessions[session_id] = (now, data, size)
+        _preview_sessions_bytes += size
+        _expire_preview_sessions(now)
+        # Evict oldest first; the newest session always stays, even on its own over the cap
+        while len(_preview_sessions) > 1 and (len(_preview_sessions) > MAX_PREVIEW_SESSIONS or
+                                              _preview_sessions_bytes > MAX_PREVIEW_SESSION_BYTES):
+            _pop_preview_session()
+        if _preview_reaper is None:
+            # Started on first use so importing the module spawns nothing
+            _preview_reaper = threading.Thread(target=_reap_preview_sessions, daemon=True)
+            _preview_reaper.start()
+
+def get_preview_session(session_id, pop=False):
+    """The stored session data, or None if unknown or expired"""
+    with _preview_sessions_lock:
+        entry = _pop_preview_session(session_id) if pop else _preview_sessions.get(session_id)
+    if entry is None or time.monotonic() - entry[0] >= SESSION_TTL_SEC:
+        return None
+    return entry[1]
 
-@app.route('/api/upload-xml', methods=['POST', 'OPTIONS'])
+@app.route('/api/upload-xml', methods=['POST'])
 def api_upload_xml():
     """Store XML temporarily and return a session ID for the preview page"""
-    if request.method == 'OPTIONS':
-        response = make_response()
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-        return response
-
     data = request.get_json()
     if not data or 'xml' not in data:
         return jsonify({'error': 'No XML provided'}), 400
 
-    session_id = str(_uuid.uuid4())
+    session_id = str(uuid.uuid4())
     bpmn_content = data['xml'].encode('utf-8')
     metadata = extract_metadata_from_bpmn(bpmn_content)
 
-    _preview_sessions[session_id] = {
-        'xml': data['xml'],
+    # Keep the encoded XML so generate-and-download doesn't re-encode it
+    store_preview_session(session_id, {
+        'xml_bytes': bpmn_content,
         'metadata': metadata
-    }
+    })
 
-    resp = jsonify({'session_id': session_id, 'metadata': metadata})
-    resp.headers['Access-Control-Allow-Origin'] = '*'
-    return resp
+    return jsonify({'session_id': session_id, 'metadata': metadata})
 
 @app.route('/preview/<session_id>')
 def preview_page(session_id):
     """Serve the SOP preview/edit form pre-populated from BPMN"""
-    session_data = _preview_sessions.get(session_id)
+    session_data = get_preview_session(session_id)
     if not session_data:
         return 'Session expired. Please try again from Camunda Modeler.', 404
 
     meta = session_data['metadata']
-    return render_template_string(PREVIEW_HTML, session_id=session_id, meta=meta)
+    return html_response(render_template(PREVIEW_TEMPLATE, session_id=session_id, meta=meta))
 
-@app.route('/api/generate-and-download/<session_id>', methods=['POST', 'OPTIONS'])
+@app.route('/api/generate-and-download/<session_id>', methods=['POST'])
 def api_generate_and_download(session_id):
     """Generate .docx from stored XML + user-edited metadata, return binary"""
-    if request.method == 'OPTIONS':
-        response = make_response()
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-        return response
-
-    session_data = _preview_sessions.get(session_id)
+    session_data = get_preview_session(session_id)
     if not session_data:
-        resp = jsonify({'error': 'Session expired'})
-        resp.headers['Access-Control-Allow-Origin'] = '*'
-        return resp, 404
+        return jsonify({'error': 'Session expired'}), 404
 
     try:
-        bpmn_content = session_data['xml'].encode('utf-8')
+        bpmn_content = session_data['xml_bytes']
         form_data = request.form.to_dict()
 
-        metadata = {}
-        for field in ['process_name', 'process_code', 'issued_by', 'release_date', 'process_owner', 'purpose', 'scope']:
-            metadata[field] = form_data.get(field, '').strip()
+        get = form_data.get
+        metadata = {field: get(field, '').strip() for field in
+                    ('process_name', 'process_code', 'issued_by', 'release_date', 'process_owner', 'purpose', 'scope')}
 
         # Fall back to BPMN metadata for empty fields
         bpmn_meta = session_data['metadata']
-        for field in ['process_name', 'process_code', 'purpose', 'scope']:
-            if not metadata.get(field) and field in bpmn_meta:
+        for field in ('process_name', 'process_code', 'purpose', 'scope'):
+            if not metadata[field] and field in bpmn_meta:
                 metadata[field] = bpmn_meta[field]
 
         # Parse abbreviations
-        abbrev_terms = request.form.getlist('abbrev_term[]')
-        abbrev_defs = request.form.getlist('abbrev_def[]')
-        abbreviations = []
-        for term, definition in zip(abbrev_terms, abbrev_defs):
-            if term.strip() or definition.strip():
-                abbreviations.append({'term': term.strip(), 'definition': definition.strip()})
+        abbreviations = form_pairs(request.form, 'abbrev_term[]', 'abbrev_def[]', 'term', 'definition')
         if not abbreviations and 'abbreviations_list' in bpmn_meta:
             abbreviations = bpmn_meta['abbreviations_list']
         metadata['abbreviations_list'] = abbreviations
 
         # Parse references
-        ref_ids = request.form.getlist('ref_id[]')
-        ref_titles = request.form.getlist('ref_title[]')
-        references = []
-        for doc_id, title in zip(ref_ids, ref_titles):
-            if doc_id.strip() or title.strip():
-                references.append({'id': doc_id.strip(), 'title': title.strip()})
+        references = form_pairs(request.form, 'ref_id[]', 'ref_title[]', 'id', 'title')
         if not references:
             lane_names = bpmn_meta.get('lane_names', [])
             for lane_name in lane_names:
@@ -1923,55 +1585,57 @@ def api_generate_and_download(session_id):
         metadata['references_list'] = references
 
         # Parse policies
-        policy_refs = request.form.getlist('policy_ref[]')
-        policy_texts = request.form.getlist('policy_text[]')
-        policies = []
-        for ref, text in zip(policy_refs, policy_texts):
-            if ref.strip() or text.strip():
-                policies.append({'ref': ref.strip(), 'policy': text.strip()})
-        metadata['general_policies_list'] = policies
+        metadata['general_policies_list'] = form_pairs(request.form, 'policy_ref[]', 'policy_text[]', 'ref', 'policy')
 
         # Get template selection
         template_name = form_data.get('template', 'earthlink')
 
-        context = parse_bpmn_to_context(bpmn_content, metadata)
-        file_stream = create_word_doc_from_template(context, template_name=template_name)
+        docx_path = generate_docx(bpmn_content, metadata, template_name=template_name)
 
-        if not file_stream:
+        if not docx_path:
             return jsonify({'error': 'Failed to generate document'}), 500
 
-        file_stream.seek(0)
         output_name = metadata.get('process_name', 'SOP_Document')
 
         # Clean up session
-        _preview_sessions.pop(session_id, None)
+        get_preview_session(session_id, pop=True)
 
-        response = make_response(file_stream.read())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        response.headers['Content-Disposition'] = f'attachment; filename="{output_name}.docx"'
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        return response
+        return send_docx(docx_path, output_name)
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        resp = jsonify({'error': str(e)})
-        resp.headers['Access-Control-Allow-Origin'] = '*'
-        return resp, 500
-
-@app.route('/api/generate-from-xml', methods=['OPTIONS'])
-def api_generate_from_xml_options():
-    """CORS preflight for Camunda Modeler plugin"""
-    response = make_response()
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
-    return response
+        log.exception("Generate and download failed")
+        return jsonify({'error': str(e)}), 500
+
+def generate_form_data():
+    """Form fields for /generate: pasted XML arrives as a JSON object (list values for
+    the repeated row fields), uploads as multipart. Both are read through a MultiDict."""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        return MultiDict([(key, item) for key, value in data.items()
+                          for item in (value if isinstance(value, list) else [value])])
+    return request.form
+
+# Output-name lookups for pasted XML, compiled once
+BPMN_NS = {'bpmn': 'http://www.omg.org/spec/BPMN/20100524/MODEL'}
+_XP_PARTICIPANT_NAME = etree.XPath("(.//bpmn:participant/@name[. != ''])[1]", namespaces=BPMN_NS)
+_XP_PROCESS_NAME = etree.XPath("(.//bpmn:process/@name[. != ''])[1]", namespaces=BPMN_NS)
+
+def form_pairs(form, first_field, second_field, first_key, second_key):
+    """Rows of a two-column repeating form section (e.g. abbrev_term[] / abbrev_def[]),
+    stripped, with rows that are blank in both columns dropped"""
+    if first_field not in form or second_field not in form:
+        return []  # zip() would give nothing anyway; skip the getlist() scans
+    strip = str.strip
+    rows = ((strip(a), strip(b)) for a, b in zip(form.getlist(first_field), form.getlist(second_field)))
+    return [{first_key: a, second_key: b} for a, b in rows if a or b]
 
 @app.route('/generate', methods=['POST'])
 def generate_sop():
-    input_type = request.form.get('input_type')
+    form = generate_form_data()
+    input_type = form.get('input_type')
     bpmn_content = None
+    bpmn_upload = None
+    root = None
     output_name = None
 
     if input_type == 'bpmn':
@@ -1981,40 +1645,37 @@ def generate_sop():
         if file.filename == '':
             return "No selected file", 400
         if file:
-            bpmn_content = file.read()
+            # Keep the upload as a stream; the parser and the archive copy read it from there
+            bpmn_content = file.stream
+            bpmn_upload = file
             # Use BPMN filename (without extension) for output
             output_name = file.filename.rsplit('.', 1)[0] if '.' in file.filename else file.filename
     elif input_type == 'xml':
-        xml_code = request.form.get('xml_code')
+        xml_code = form.get('xml_code')
         if not xml_code:
             return "No XML code provided", 400
-        bpmn_content = xml_code.encode('utf-8') # Encode to bytes for consistency with file.read()
+        xml_bytes = xml_code.encode('utf-8')
+        # Same stream interface as an uploaded file
+        bpmn_content = io.BytesIO(xml_bytes)
 
         # Extract pool/process name from XML
-        try:
-            from lxml import etree
-            root = etree.fromstring(bpmn_content)
-            ns = {'bpmn': 'http://www.omg.org/spec/BPMN/20100524/MODEL'}
-
-            # Try to get participant (pool) name
-            participant = root.find('.//bpmn:participant', namespaces=ns)
-            if participant is not None and participant.get('name'):
-                output_name = participant.get('name')
-            else:
-                # Fallback to process name
-                process = root.find('.//bpmn:process', namespaces=ns)
-                if process is not None and process.get('name'):
-                    output_name = process.get('name')
-        except:
-            pass
+        root = try_parse_bpmn_root(xml_bytes)
+        if root is not None:
+            # Prefer the participant (pool) name, fall back to the process name
+            names = _XP_PARTICIPANT_NAME(root) or _XP_PROCESS_NAME(root)
+            if names:
+                output_name = str(names[0])
     else:
         return "Invalid input type selected", 400
 
     if bpmn_content:
-        metadata = request.form.to_dict()
+        metadata = form.to_dict()
+
+        if root is None:
+            root = try_parse_bpmn_root(bpmn_content)
 
         # Extract BPMN metadata for fields user left empty
-        bpmn_metadata = extract_metadata_from_bpmn(bpmn_content)
+        bpmn_metadata = extract_metadata_from_bpmn(bpmn_content, root=root)
 
         # For simple string fields: use form value if non-empty, else BPMN value
         for field in ['process_name', 'process_code', 'purpose', 'scope']:
@@ -2023,24 +1684,14 @@ def generate_sop():
                 metadata[field] = bpmn_metadata[field]
 
         # Parse abbreviation entries
-        abbrev_terms = request.form.getlist('abbrev_term[]')
-        abbrev_defs = request.form.getlist('abbrev_def[]')
-        abbreviations = []
-        for term, definition in zip(abbrev_terms, abbrev_defs):
-            if term.strip() or definition.strip():  # Only add non-empty entries
-                abbreviations.append({'term': term.strip(), 'definition': definition.strip()})
+        abbreviations = form_pairs(form, 'abbrev_term[]', 'abbrev_def[]', 'term', 'definition')
         # If no user abbreviations, fall back to BPMN-extracted ones
         if not abbreviations and 'abbreviations_list' in bpmn_metadata:
             abbreviations = bpmn_metadata['abbreviations_list']
         metadata['abbreviations_list'] = abbreviations
 
         # Parse reference document entries
-        ref_ids = request.form.getlist('ref_id[]')
-        ref_titles = request.form.getlist('ref_title[]')
-        references = []
-        for doc_id, title in zip(ref_ids, ref_titles):
-            if doc_id.strip() or title.strip():  # Only add non-empty entries
-                references.append({'id': doc_id.strip(), 'title': title.strip()})
+        references = form_pairs(form, 'ref_id[]', 'ref_title[]', 'id', 'title')
 
         # Auto-add lane approvals + DGM row ONLY if form sent no references
         # (i.e., JavaScript auto-fill didn't run). If user already has references
@@ -2064,20 +1715,13 @@ def generate_sop():
         metadata['references_list'] = references
 
         # Parse general policy entries
-        policy_refs = request.form.getlist('policy_ref[]')
-        policy_texts = request.form.getlist('policy_text[]')
-        policies = []
-        for ref, text in zip(policy_refs, policy_texts):
-            if ref.strip() or text.strip():
-                policies.append({'ref': ref.strip(), 'policy': text.strip()})
-        metadata['general_policies_list'] = policies
+        metadata['general_policies_list'] = form_pairs(form, 'policy_ref[]', 'policy_text[]', 'ref', 'policy')
 
         # Get template selection
         template_name = metadata.get('template', 'earthlink')
 
-        context = parse_bpmn_to_context(bpmn_content, metadata)
-        file_stream = create_word_doc_from_template(context, template_name=template_name)
-        if file_stream:
+        docx_path = generate_docx(bpmn_content, metadata, template_name=template_name, root=root)
+        if docx_path:
             # Save to history on successful generation
             history_manager.set_user('local')
             history_data = {
@@ -2096,70 +1740,61 @@ def generate_sop():
                 output_name = metadata.get('process_name', 'Generated')
 
             # Show save dialog and save file
-            import tkinter as tk
-            from tkinter import filedialog
-
-            # Create hidden root window for dialog
-            root = tk.Tk()
-            root.withdraw()
-            root.attributes('-topmost', True)
-
-            # Show save dialog
-            save_path = filedialog.asksaveasfilename(
-                parent=root,
-                defaultextension='.docx',
-                filetypes=[('Word Document', '*.docx')],
-                initialfile=f"{output_name}.docx",
-                title='Save SOP Document'
-            )
-
-            root.destroy()
+            save_path = ask_save_path(f"{output_name}.docx", 'Word Document', '.docx')
 
             if save_path:
                 # Save the file
-                file_stream.seek(0)
-                with open(save_path, 'wb') as f:
-                    f.write(file_stream.read())
+                shutil.copyfile(docx_path, save_path)
 
-                # Auto-save to archive
-                import tempfile
+                # Auto-save to archive: the BPMN streams straight from the request
+                # (keeping an upload's own name), the DOCX is hard-linked from the
+                # cache but archived under the process name, not the cache hash
                 try:
-                    # Save BPMN to temp file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.bpmn') as tmp_bpmn:
-                        tmp_bpmn.write(bpmn_content)
-                        tmp_bpmn_path = tmp_bpmn.name
-
-                    # Save DOCX to temp file
-                    file_stream.seek(0)
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp_docx:
-                        tmp_docx.write(file_stream.read())
-                        tmp_docx_path = tmp_docx.name
-
-                    # Archive the files
                     archive_manager.save_archive(
                         user_id='local',
                         process_name=output_name,
-                        bpmn_file_path=tmp_bpmn_path,
-                        docx_file_path=tmp_docx_path
+                        bpmn_file_path=bpmn_upload or bpmn_content,
+                        docx_file_path=docx_path,
+                        bpmn_filename=None if bpmn_upload else f"{output_name}.bpmn",
+                        docx_filename=f"{output_name}.docx"
                     )
-
-                    # Clean up temp files
-                    os.remove(tmp_bpmn_path)
-                    os.remove(tmp_docx_path)
                 except Exception as e:
                     debug_log(f"Error archiving: {e}")
 
-                return jsonify({'success': True, 'message': f'Document saved to {save_path}', 'path': save_path})
+                # Hand back the updated history so the page doesn't have to refetch it
+                return jsonify({'success': True, 'message': f'Document saved to {save_path}', 'path': save_path,
+                                'history': history_manager.get_all()})
             else:
                 return jsonify({'success': False, 'message': 'Save cancelled'})
     return "An error occurred during file processing. Check the console for details.", 500
 
+def wait_for_port(port, host='127.0.0.1', timeout=10.0):
+    """Block until something is listening on host:port (or the timeout passes)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.settimeout(0.2)
+            if sock.connect_ex((host, port)) == 0:
+                return True
+        time.sleep(0.02)
+    return False
+
+# Waitress settings shared by the desktop app and sop_server.py
+SERVER_OPTIONS = {
+    # Generation holds a thread for the whole parse + render
+    'threads': max(8, (os.cpu_count() or 1) * 2),
+    # Read request bodies (BPMN uploads) in 64 KB chunks instead of 8 KB
+    'recv_bytes': 65536,
+    # Keep buffered responses up to 4 MB in memory before spilling to a temp file
+    'outbuf_overflow': 4 * 1024 * 1024,
+    # Accept more open connections (webview + Modeler plugin keep-alives) than the default 100
+    'connection_limit': 200,
+}
+
 def start_server():
     """Start Flask server in background thread"""
-    serve(app, host='127.0.0.1', port=8000, _quiet=True)
-
-# Global reference to webview window for save dialogs
-webview_window = None
+    warm_render_pool()
+    serve(app, host='127.0.0.1', port=8000, _quiet=True, **SERVER_OPTIONS)
 
 def main():
     """Main entry point - launches native window with pywebview"""
@@ -2170,12 +1805,11 @@ def main():
     server_thread = threading.Thread(target=start_server, daemon=True)
     server_thread.start()
 
-    # Give server time to start
-    import time
-    time.sleep(0.5)
+    # Open the window as soon as the server accepts connections
+    wait_for_port(8000)
 
-    # Create native window
-    webview.create_window(
+    # Create native window (kept for save dialogs)
+    webview_window = webview.create_window(
         'BPMN to SOP Generator',
         'http://127.0.0.1:8000',
         width=1000,
@@ -2186,4 +1820,6 @@ def main():
     webview.start()
 
 if __name__ == '__main__':
+    # Needed so frozen builds can start render worker processes
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -5,11 +5,21 @@ Handles storage and retrieval of BPMN files and generated Word documents per use
 
 import sqlite3
 import os
+import re
 import shutil
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union, BinaryIO
 import json
 
+# A path on disk, an uploaded FileStorage, or any other binary stream
+ArchiveSource = Union[str, BinaryIO]
+
+# Characters Windows won't take in a file name (plus control characters).
+# Unlike werkzeug's secure_filename this keeps non-ASCII (e.g. Arabic) names.
+_UNSAFE_FILENAME_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+_RESERVED_FILENAMES = frozenset({'CON', 'PRN', 'AUX', 'NUL'} |
+                                {f'{p}{i}' for p in ('COM', 'LPT') for i in range(1, 10)})
+
 class ArchiveManager:
     def __init__(self, archive_dir: str = "archives", db_path: str = "archive.db"):
         """
@@ -55,15 +65,64 @@ class ArchiveManager:
         conn.commit()
         conn.close()
 
-    def save_archive(self, user_id: str, process_name: str, bpmn_file_path: str, docx_file_path: str) -> int:
+    @staticmethod
+    def _clean_filename(name: str, default: str) -> str:
+        """name made safe to create inside the archive folder, or default"""
+        name = _UNSAFE_FILENAME_CHARS.sub('_', os.path.basename(name or '')).strip(' .')
+        if not name:
+            return default
+        if name.split('.', 1)[0].upper() in _RESERVED_FILENAMES:
+            name = '_' + name
+        return name
+
+    @classmethod
+    def _source_filename(cls, source: ArchiveSource, filename: Optional[str], default: str) -> str:
+        """File name to archive source under: filename if given, else the upload's
+        own name or the path's basename"""
+        if not filename:
+            if isinstance(source, (str, os.PathLike)):
+                filename = os.path.basename(source)
+            else:
+                filename = getattr(source, 'filename', None)
+        return cls._clean_filename(filename, default)
+
+    @staticmethod
+    def _store_file(source: ArchiveSource, dest: str):
+        """
+        Put source at dest with as little copying as possible: a hard link for
+        a path (a copy across drives), a single streamed write otherwise.
+        Paths must not be rewritten in place afterwards - the render cache
+        only ever replaces its files.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            try:
+                os.link(source, dest)
+            except OSError:
+                shutil.copy2(source, dest)
+        elif hasattr(source, 'save'):
+            # werkzeug FileStorage: streams its spooled upload straight to dest,
+            # from the start even if it was parsed first
+            source.stream.seek(0)
+            source.save(dest)
+        else:
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            with open(dest, 'wb') as f:
+                shutil.copyfileobj(source, f)
+
+    def save_archive(self, user_id: str, process_name: str, bpmn_file_path: ArchiveSource,
+                     docx_file_path: ArchiveSource, bpmn_filename: Optional[str] = None,
+                     docx_filename: Optional[str] = None) -> int:
         """
         Save BPMN and Word files to user's archive
 
         Args:
             user_id: User identifier
             process_name: Name of the process
-            bpmn_file_path: Path to source BPMN file
-            docx_file_path: Path to source Word file
+            bpmn_file_path: Path to source BPMN file, or an upload/stream
+            docx_file_path: Path to source Word file, or an upload/stream
+            bpmn_filename: Name to archive the BPMN under (default: the source's name)
+            docx_filename: Name to archive the Word file under (default: the source's name)
 
         Returns:
             Archive ID
@@ -75,20 +134,28 @@ class ArchiveManager:
         user_dir = os.path.join(self.archive_dir, user_id)
         os.makedirs(user_dir, exist_ok=True)
 
-        # Create archive folder
+        # Create archive folder (a fresh one even within the same second, so a
+        # same-named file from another archive is never overwritten)
         archive_folder = os.path.join(user_dir, timestamp)
-        os.makedirs(archive_folder, exist_ok=True)
+        suffix = 1
+        while True:
+            try:
+                os.makedirs(archive_folder)
+                break
+            except FileExistsError:
+                suffix += 1
+                archive_folder = os.path.join(user_dir, f"{timestamp}_{suffix}")
 
         # Get file names
-        bpmn_filename = os.path.basename(bpmn_file_path)
-        docx_filename = os.path.basename(docx_file_path)
+        bpmn_filename = self._source_filename(bpmn_file_path, bpmn_filename, 'process.bpmn')
+        docx_filename = self._source_filename(docx_file_path, docx_filename, 'process.docx')
 
-        # Copy files to archive folder
+        # Link or stream files into archive folder
         bpmn_dest = os.path.join(archive_folder, bpmn_filename)
         docx_dest = os.path.join(archive_folder, docx_filename)
 
-        shutil.copy2(bpmn_file_path, bpmn_dest)
-        shutil.copy2(docx_file_path, docx_dest)
+        self._store_file(bpmn_file_path, bpmn_dest)
+        self._store_file(docx_file_path, docx_dest)
 
         # Save to database
         conn = sqlite3.connect(self.db_path)
@@ -3,9 +3,72 @@ BPMN to SOP Parser - Full Implementation Following Guideline V2
 Generates complete multi-paragraph structure with proper formatting
 """
 
+import copy
+import hashlib
 import re
+import threading
+from collections import OrderedDict
 from lxml import etree
-from typing import List, Dict, Tuple, Optional
+from typing import BinaryIO, List, Dict, Tuple, Optional, Union
+
+# Patterns used while cleaning element names, compiled once at import
+_RE_LINE_BREAKS = re.compile(r'[\n\r\t]+')
+_RE_WHITESPACE = re.compile(r'\s+')
+_RE_STEP_NUMBER = re.compile(r'^\s*(\d+)\s*[.:\-]?\s*')
+
+# Parsed trees keyed by a digest of the XML. The same BPMN is parsed by
+# /extract-metadata and then twice more by the generate routes (metadata +
+# SOP rows); the trees are only ever read, so one parse can serve all of them.
+# A tree takes several times its XML in memory, so the cache is bounded by the
+# XML it holds as well as by entry count; bigger documents are not kept at all.
+_PARSE_CACHE_SIZE = 8
+_PARSE_CACHE_MAX_BYTES = 4 * 1024 * 1024
+# Whitespace between elements, comments and the xml:id table are never used by
+# the parser, so don't build them. Entities stay unresolved - the XML is pasted
+# or uploaded by the user.
+BPMN_XML_PARSER = etree.XMLParser(remove_blank_text=True, remove_comments=True,
+                                  resolve_entities=False, collect_ids=False)
+_parse_cache = OrderedDict()  # digest -> (root, XML size)
+_parse_cache_bytes = 0
+_parse_cache_lock = threading.Lock()
+
+# extract_metadata_from_bpmn() results by the same digest, so previewing the
+# same diagram again skips the metadata walk as well as the parse
+_METADATA_CACHE_SIZE = 64
+_metadata_cache = OrderedDict()
+_metadata_cache_lock = threading.Lock()
+
+
+def _content_and_key(xml_content: Union[bytes, BinaryIO]) -> Tuple[bytes, bytes]:
+    """The XML bytes and their cache digest"""
+    if hasattr(xml_content, 'read'):
+        # Streams are read from the start, so the same upload can be parsed again
+        xml_content.seek(0)
+        xml_content = xml_content.read()
+    return xml_content, hashlib.blake2b(xml_content, digest_size=16).digest()
+
+
+def parse_bpmn_root(xml_content: Union[bytes, BinaryIO]):
+    """Parse BPMN bytes or a binary stream into an lxml root, reusing an earlier parse of the same XML"""
+    global _parse_cache_bytes
+    xml_content, key = _content_and_key(xml_content)
+    with _parse_cache_lock:
+        entry = _parse_cache.get(key)
+        if entry is not None:
+            _parse_cache.move_to_end(key)
+            return entry[0]
+    root = etree.fromstring(xml_content, BPMN_XML_PARSER)
+    size = len(xml_content)
+    if size > _PARSE_CACHE_MAX_BYTES:
+        return root
+    with _parse_cache_lock:
+        if key not in _parse_cache:
+            _parse_cache[key] = (root, size)
+            _parse_cache_bytes += size
+        while len(_parse_cache) > _PARSE_CACHE_SIZE or _parse_cache_bytes > _PARSE_CACHE_MAX_BYTES:
+            _, (_, old_size) = _parse_cache.popitem(last=False)
+            _parse_cache_bytes -= old_size
+    return root
 
 class BPMNParser:
     """
@@ -29,9 +92,9 @@ class BPMNParser:
         'dc': 'http://www.omg.org/spec/DD/20100524/DC'
     }
 
-    def __init__(self, xml_content: bytes):
-        self.xml_content = xml_content
-        self.root = etree.fromstring(xml_content)
+    def __init__(self, xml_content: Union[bytes, BinaryIO, None] = None, root=None):
+        # Accept raw bytes or a binary stream (e.g. an upload), or an already parsed root
+        self.root = root if root is not None else parse_bpmn_root(xml_content)
 
         # Data structures
         self.tasks = {}
@@ -145,8 +208,8 @@ class BPMNParser:
             subprocess_id = subprocess.get('id')
             subprocess_name = subprocess.get('name', 'Unnamed Process')
             # Clean up newlines in subprocess name
-            subprocess_name = re.sub(r'[\n\r\t]+', ' ', subprocess_name)
-            subprocess_name = re.sub(r'\s+', ' ', subprocess_name).strip()
+            subprocess_name = _RE_LINE_BREAKS.sub(' ', subprocess_name)
+            subprocess_name = _RE_WHITESPACE.sub(' ', subprocess_name).strip()
 
             self.subprocesses[subprocess_id] = {
                 'name': subprocess_name,
@@ -268,17 +331,17 @@ class BPMNParser:
 
     def _extract_step_number(self, task_name: str) -> Optional[str]:
         """Extract step number from task name"""
-        match = re.match(r'^\s*(\d+)\s*[.:\-]?\s*', task_name)
+        match = _RE_STEP_NUMBER.match(task_name)
         return match.group(1) if match else None
 
     def _remove_step_number(self, task_name: str) -> str:
         """Remove step number from task name and clean up newlines"""
         # Replace newline characters (including &#10; decoded as \n) with spaces
-        cleaned_name = re.sub(r'[\n\r\t]+', ' ', task_name)
+        cleaned_name = _RE_LINE_BREAKS.sub(' ', task_name)
         # Remove step number prefix
-        cleaned_name = re.sub(r'^\s*\d+\s*[.:\-]?\s*', '', cleaned_name)
+        cleaned_name = _RE_STEP_NUMBER.sub('', cleaned_name)
         # Clean up multiple spaces and strip
-        cleaned_name = re.sub(r'\s+', ' ', cleaned_name).strip()
+        cleaned_name = _RE_WHITESPACE.sub(' ', cleaned_name).strip()
         return cleaned_name
 
     def _get_start_event_numbers(self) -> Dict[str, int]:
@@ -1909,32 +1972,50 @@ class BPMNParser:
         return metadata
 
 
-def extract_metadata_from_bpmn(xml_content: bytes) -> dict:
+def extract_metadata_from_bpmn(xml_content: Union[bytes, BinaryIO, None], root=None) -> dict:
     """
     Extract metadata from BPMN file for form auto-population.
     Does NOT generate SOP rows - just extracts metadata fields.
+    Pass root (from parse_bpmn_root) to skip parsing xml_content again.
     """
     try:
-        parser = BPMNParser(xml_content)
+        key = None
+        if xml_content is not None:
+            xml_content, key = _content_and_key(xml_content)
+            with _metadata_cache_lock:
+                cached = _metadata_cache.get(key)
+                if cached is not None:
+                    _metadata_cache.move_to_end(key)
+            if cached is not None:
+                # Callers merge form values into the lists, so hand out a copy
+                return copy.deepcopy(cached)
+
+        parser = BPMNParser(xml_content, root=root)
         metadata = parser.extract_bpmn_metadata()
 
         # Also include auto-populated inputs/outputs
         metadata['inputs'] = parser.get_process_inputs()
         metadata['outputs'] = parser.get_process_outputs()
 
+        if key is not None:
+            with _metadata_cache_lock:
+                _metadata_cache[key] = copy.deepcopy(metadata)
+                if len(_metadata_cache) > _METADATA_CACHE_SIZE:
+                    _metadata_cache.popitem(last=False)
         return metadata
     except Exception as e:
         print(f"[ERROR] BPMN Metadata Extraction Failed: {e}")
         return {}
 
 
-def parse_bpmn_to_sop(xml_content: bytes, metadata: dict) -> dict:
+def parse_bpmn_to_sop(xml_content: Union[bytes, BinaryIO, None], metadata: dict, root=None) -> dict:
     """
     Main parsing function
     Returns context with structured SOP rows for template
+    Pass root (from parse_bpmn_root) to skip parsing xml_content again.
     """
     try:
-        parser = BPMNParser(xml_content)
+        parser = BPMNParser(xml_content, root=root)
         sop_rows = parser.generate_sop_rows()
 
         # Auto-populate inputs and outputs from BPMN if not provided
@@ -1,49 +1,127 @@
+import atexit
 import json
 import os
+import threading
+import time
+import uuid
 from datetime import datetime
 from typing import List, Dict, Optional
 
 class HistoryManager:
     """Manages history of previously entered SOP metadata per user"""
 
+    # Saves are written by a background thread; bursts within this window
+    # (seconds) collapse into a single write per history file
+    SAVE_DELAY = 0.1
+
     def __init__(self, history_dir: str = 'history'):
         self.history_dir = history_dir
         self.current_user = None
         self.history = []
 
+        # Serialised history waiting to be written, keyed by file path
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._writer = None
+        # st_mtime_ns of each history file as last read or written by us
+        self._mtimes = {}
+
         # Create history directory if it doesn't exist
         os.makedirs(history_dir, exist_ok=True)
 
+        # Don't lose a save that is still waiting when the app exits
+        atexit.register(self.flush)
+
     def set_user(self, user_id: str):
         """Set the current user and load their history"""
+        if user_id == self.current_user:
+            # Every change goes through this object, so the history in memory
+            # is current unless the file was changed behind our back
+            history_file = self._get_history_file()
+            with self._pending_lock:
+                if history_file in self._pending:
+                    return
+            if self._file_mtime(history_file) == self._mtimes.get(history_file):
+                return
         self.current_user = user_id
         self.history = self._load_history()
 
+        # Entries written before ids existed get one, stored so it stays stable
+        missing = [entry for entry in self.history if 'id' not in entry]
+        for entry in missing:
+            entry['id'] = uuid.uuid4().hex
+        if missing:
+            self._save_history()
+
     def _get_history_file(self) -> str:
         """Get the history file path for current user"""
         if self.current_user:
             return os.path.join(self.history_dir, f'history_{self.current_user}.json')
         return os.path.join(self.history_dir, 'history_default.json')
 
+    @staticmethod
+    def _file_mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
     def _load_history(self) -> List[Dict]:
         """Load history from JSON file"""
         history_file = self._get_history_file()
-        if os.path.exists(history_file):
-            try:
-                with open(history_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                return []
+        with self._pending_lock:
+            pending = self._pending.get(history_file)
+        if pending is not None:
+            # Newer than what's on disk
+            return json.loads(pending)
+        with self._io_lock:
+            self._mtimes[history_file] = self._file_mtime(history_file)
+            if os.path.exists(history_file):
+                try:
+                    with open(history_file, 'r', encoding='utf-8') as f:
+                        return json.load(f)
+                except (json.JSONDecodeError, IOError):
+                    return []
         return []
 
     def _save_history(self):
-        """Save history to JSON file"""
+        """Queue the history for writing to its JSON file by the background writer"""
         history_file = self._get_history_file()
-        try:
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, indent=2, ensure_ascii=False)
-        except IOError as e:
-            print(f"Warning: Could not save history: {e}")
+        data = json.dumps(self.history, indent=2, ensure_ascii=False)
+        with self._pending_lock:
+            self._pending[history_file] = data
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name='history-writer', daemon=True)
+                self._writer.start()
+        self._dirty.set()
+
+    def _writer_loop(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.SAVE_DELAY)
+            self._dirty.clear()
+            self.flush()
+
+    def flush(self):
+        """Write any queued history to disk now"""
+        with self._pending_lock:
+            pending = list(self._pending.items())
+        for history_file, data in pending:
+            tmp_file = history_file + '.tmp'
+            try:
+                with self._io_lock:
+                    with open(tmp_file, 'w', encoding='utf-8') as f:
+                        f.write(data)
+                    os.replace(tmp_file, history_file)
+                    self._mtimes[history_file] = self._file_mtime(history_file)
+            except OSError as e:
+                print(f"Warning: Could not save history: {e}")
+            with self._pending_lock:
+                # Keep it queued if a newer save arrived meanwhile
+                if self._pending.get(history_file) is data:
+                    del self._pending[history_file]
 
     def add_entry(self, metadata: Dict):
         """
@@ -60,6 +138,7 @@ class HistoryManager:
         """
         # Create entry with timestamp
         entry = {
+            'id': uuid.uuid4().hex,
             'timestamp': datetime.now().isoformat(),
             'process_name': metadata.get('process_name', ''),
             'process_code': metadata.get('process_code', ''),
@@ -70,10 +149,10 @@ class HistoryManager:
             'general_policies_list': metadata.get('general_policies_list', [])
         }
 
-        # Check if this exact entry already exists (excluding timestamp)
-        entry_without_timestamp = {k: v for k, v in entry.items() if k != 'timestamp'}
+        # Check if this exact entry already exists (excluding id and timestamp)
+        entry_without_timestamp = {k: v for k, v in entry.items() if k not in ('id', 'timestamp')}
         for existing in self.history:
-            existing_without_timestamp = {k: v for k, v in existing.items() if k != 'timestamp'}
+            existing_without_timestamp = {k: v for k, v in existing.items() if k not in ('id', 'timestamp')}
             if existing_without_timestamp == entry_without_timestamp:
                 # Update timestamp of existing entry
                 existing['timestamp'] = entry['timestamp']
@@ -5,8 +5,8 @@ a = Analysis(
     ['D:\\camu-new\\camunda-modeler\\client\\src\\plugins\\sop-generator-installer\\backend\\sop_server.py'],
     pathex=[],
     binaries=[],
-    datas=[('templates', 'templates'), ('final_master_template_2.docx', '.'), ('sabah_template.docx', '.'), ('sana_template.docx', '.'), ('tarabut_template.docx', '.'), ('window_world_template.docx', '.')],
-    hiddenimports=['waitress', 'docxtpl', 'lxml', 'flask'],
+    datas=[('templates', 'templates'), ('static', 'static'), ('final_master_template_2.docx', '.'), ('sabah_template.docx', '.'), ('sana_template.docx', '.'), ('tarabut_template.docx', '.'), ('window_world_template.docx', '.')],
+    hiddenimports=['waitress', 'docx', 'lxml', 'flask', 'orjson'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
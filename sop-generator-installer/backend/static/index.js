@@ -0,0 +1,621 @@
+// Fixed page elements, looked up once (the script is deferred, so the whole
+// document has been parsed by the time it runs)
+const els = {};
+['template-input', 'release_date', 'history-select', 'process_name', 'process_code', 'purpose', 'scope',
+ 'abbreviations-container', 'references-container', 'policies-container', 'archive-select', 'archive-actions',
+ 'sop-form', 'generate-btn', 'loader', 'bpmn_file', 'xml_code', 'input_type_bpmn', 'input_type_xml',
+ 'bpmn-upload-section', 'xml-paste-section', 'metadata-sections', 'toggle-metadata-btn']
+    .forEach(id => { els[id] = document.getElementById(id); });
+
+const tplBtns = {};
+['earthlink', 'sana', 'window_world', 'tarabut', 'sabah']
+    .forEach(t => { tplBtns[t] = document.getElementById('btn-' + t); });
+
+function selectTemplate(name) {
+    els['template-input'].value = name;
+    for (const t in tplBtns) {
+        tplBtns[t].classList.toggle('active', t === name);
+    }
+}
+
+function getCookie(name) {
+    let value = "; " + document.cookie;
+    let parts = value.split("; " + name + "=");
+    if (parts.length === 2) return parts.pop().split(";").shift();
+}
+
+// Auto-fill release date with today's date, e.g. "05 Sep 2026". en-US parts
+// reassembled in day-month-year order; en-GB would spell September "Sept".
+const RELEASE_DATE_FMT = new Intl.DateTimeFormat('en-US', {day: '2-digit', month: 'short', year: 'numeric'});
+
+function setTodaysDate() {
+    const parts = {};
+    RELEASE_DATE_FMT.formatToParts(new Date()).forEach(part => { parts[part.type] = part.value; });
+    els['release_date'].value = `${parts.day} ${parts.month} ${parts.year}`;
+}
+
+// Stale-while-revalidate for the history/archive lists: render the copy kept
+// in localStorage right away, then revalidate it with If-None-Match and only
+// re-render when the server sends a new body
+async function cachedFetchJson(url, storeKey, render) {
+    let cached = null;
+    let etag = null;
+    try {
+        cached = localStorage.getItem(storeKey);
+        etag = localStorage.getItem(storeKey + ':etag');
+    } catch (e) {
+        // Storage unavailable - fall back to plain fetches
+    }
+    if (cached) {
+        render(JSON.parse(cached));
+    }
+
+    const headers = cached && etag ? {'If-None-Match': etag} : {};
+    const response = await fetch(url, {headers: headers, cache: 'no-store'});
+    if (response.status === 304 || !response.ok) return;
+
+    const body = await response.text();
+    try {
+        localStorage.setItem(storeKey, body);
+        const newEtag = response.headers.get('ETag');
+        if (newEtag) {
+            localStorage.setItem(storeKey + ':etag', newEtag);
+        } else {
+            localStorage.removeItem(storeKey + ':etag');
+        }
+    } catch (e) {
+        // Quota exceeded - the next load just refetches
+    }
+    render(JSON.parse(body));
+}
+
+function invalidateCachedJson(storeKey) {
+    try {
+        localStorage.removeItem(storeKey);
+        localStorage.removeItem(storeKey + ':etag');
+    } catch (e) {}
+}
+
+const HISTORY_CACHE_KEY = 'sop:history';
+const ARCHIVES_CACHE_KEY = 'sop:archives';
+
+// One formatter for every history/archive timestamp; toLocale*String would
+// build a new Intl.DateTimeFormat on each call
+const DT_FMT = new Intl.DateTimeFormat(undefined, {year: 'numeric', month: 'numeric', day: 'numeric', hour: '2-digit', minute: '2-digit'});
+
+// History Management Functions
+let historyData = [];
+// Options are keyed by entry id, so a refresh that reorders the list
+// can't point a selection at the wrong entry
+let historyById = new Map();
+
+// Fetch history from server
+async function fetchHistory() {
+    try {
+        await cachedFetchJson('/api/history', HISTORY_CACHE_KEY, data => {
+            historyData = data;
+            populateHistoryDropdown();
+        });
+    } catch (error) {
+        console.error('Error fetching history:', error);
+    }
+}
+
+// Escape text for the <option> string builders below: one regex pass with a
+// lookup table. Rows filled through .value need no escaping at all.
+const ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+const ESCAPE_RE = /[&<>"']/g;
+
+function escapeAttr(text) {
+    return text == null ? '' : String(text).replace(ESCAPE_RE, ch => ESCAPES[ch]);
+}
+
+// Build <option> markup in idle-time slices so a long list never blocks
+// typing in the form; the select is still swapped with one innerHTML write.
+// A newer fill of the same select cancels one that is still running.
+const whenIdle = window.requestIdleCallback
+    ? step => window.requestIdleCallback(step)
+    : step => setTimeout(() => step(null), 1);
+const fillTokens = new WeakMap();
+const FILL_BATCH = 64;  // options per slice when requestIdleCallback is unavailable
+
+function fillSelectWhenIdle(select, placeholderHtml, items, optionHtml, done) {
+    const token = {};
+    fillTokens.set(select, token);
+    const parts = [placeholderHtml];
+    let i = 0;
+    function step(deadline) {
+        if (fillTokens.get(select) !== token) return;
+        const end = deadline ? items.length : Math.min(items.length, i + FILL_BATCH);
+        while (i < end && (!deadline || deadline.timeRemaining() > 2)) {
+            parts.push(optionHtml(items[i++]));
+        }
+        if (i < items.length) {
+            whenIdle(step);
+            return;
+        }
+        // Read the selection now, not at the start, in case the user changed it meanwhile
+        const selected = select.value;
+        select.innerHTML = parts.join('');
+        done(selected);
+    }
+    whenIdle(step);
+}
+
+// Populate history dropdown
+function populateHistoryDropdown() {
+    // Options carry no listeners or children, so one HTML string assigned
+    // once is cheaper than a createElement/appendChild pair per entry
+    historyById = new Map(historyData.map(entry => [String(entry.id), entry]));
+    fillSelectWhenIdle(els['history-select'], '<option value="">-- Select a previous entry --</option>', historyData, entry => {
+        // Format the display text with date and time
+        const timestamp = DT_FMT.format(new Date(entry.timestamp));
+        const processName = entry.process_name || 'Unnamed';
+        const processCode = entry.process_code ? ` (${entry.process_code})` : '';
+        return '<option value="' + escapeAttr(entry.id) + '">' + escapeAttr(`${timestamp} - ${processName}${processCode}`) + '</option>';
+    }, selected => {
+        // Keep the current selection if the entry is still there
+        if (historyById.has(selected)) els['history-select'].value = selected;
+    });
+}
+
+// Load selected history entry into form
+function loadHistoryEntry() {
+    const selectedId = els['history-select'].value;
+
+    if (selectedId === '') {
+        alert('Please select an entry from history');
+        return;
+    }
+
+    const entry = historyById.get(selectedId);
+    if (!entry) {
+        alert('Error loading history entry');
+        return;
+    }
+
+    // Populate form fields
+    els['process_name'].value = entry.process_name || '';
+    els['process_code'].value = entry.process_code || '';
+    els['purpose'].value = entry.purpose || '';
+    els['scope'].value = entry.scope || '';
+
+    // Populate the lists (an empty list keeps one blank row)
+    setRows('abbrev', (entry.abbreviations_list || []).map(abbrev => [abbrev.term, abbrev.definition]));
+    setRows('ref', (entry.references_list || []).map(ref => [ref.id, ref.title]));
+    setRows('policy', (entry.general_policies_list || []).map(pol => [pol.ref, pol.policy]));
+
+    alert('History entry loaded successfully!');
+}
+
+// Row prototype for the abbreviation/reference/policy lists. Rows are cloned
+// from it and filled through .value, so no HTML is parsed (or escaped) per row.
+const ROW_TPL = document.createElement('template');
+ROW_TPL.innerHTML = '<div style="display: grid; grid-template-columns: 1fr 2fr auto; gap: 1em; margin-bottom: 1em;">' +
+    '<input type="text" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">' +
+    '<input type="text" style="font-size: 1rem; padding: 0.75em; border: 1px solid #ced4da; border-radius: 8px;">' +
+    '<button type="button" class="remove-btn" style="background-color: #dc3545; color: white; border: none; border-radius: 8px; padding: 0.75em 1em; cursor: pointer;">Remove</button>' +
+    '</div>';
+const ROW_PROTO = ROW_TPL.content.firstChild;
+
+// The three dynamic lists share one row shape; only names/placeholders differ
+const ROW_SPECS = {
+    abbrev: {className: 'abbrev-entry', container: 'abbreviations-container',
+             fields: [['abbrev_term[]', 'Term'], ['abbrev_def[]', 'Definition']],
+             minMsg: 'At least one abbreviation entry must remain.'},
+    ref:    {className: 'ref-entry', container: 'references-container',
+             fields: [['ref_id[]', 'Document ID'], ['ref_title[]', 'Document Title']],
+             minMsg: 'At least one reference entry must remain.'},
+    policy: {className: 'policy-entry', container: 'policies-container',
+             fields: [['policy_ref[]', 'Ref'], ['policy_text[]', 'General Policy']],
+             minMsg: 'At least one policy entry must remain.'}
+};
+
+// values: one per field, in ROW_SPECS order
+function makeRow(kind, values, autofilled) {
+    const spec = ROW_SPECS[kind];
+    const row = ROW_PROTO.cloneNode(true);
+    row.className = spec.className;
+    const inputs = row.querySelectorAll('input');
+    spec.fields.forEach(([name, placeholder], i) => {
+        inputs[i].name = name;
+        inputs[i].placeholder = placeholder;
+        inputs[i].value = (values && values[i]) || '';
+        if (autofilled) inputs[i].classList.add('autofilled');
+    });
+    return row;
+}
+
+// Swap a list's rows in one mutation; an empty list keeps one blank row
+function setRows(kind, valuesList, autofilled) {
+    const rows = valuesList.map(values => makeRow(kind, values, autofilled));
+    els[ROW_SPECS[kind].container].replaceChildren(...(rows.length ? rows : [makeRow(kind)]));
+}
+
+function addRow(kind) {
+    els[ROW_SPECS[kind].container].appendChild(makeRow(kind));
+}
+
+// True when every input in the list is blank
+function rowsEmpty(kind) {
+    const inputs = els[ROW_SPECS[kind].container].querySelectorAll('input');
+    return Array.prototype.every.call(inputs, input => !input.value.trim());
+}
+
+// One click listener per list handles every row's Remove button
+function installRemoveDelegation(container, minMsg) {
+    container.addEventListener('click', function(e) {
+        const btn = e.target.closest('.remove-btn');
+        if (!btn) return;
+        if (container.children.length > 1) {
+            btn.parentElement.remove();
+        } else {
+            alert(minMsg);
+        }
+    }, { passive: true });
+}
+
+// Skip the DOM writes when the selected input type hasn't changed
+let lastInputTypeBpmn = null;
+
+function toggleInputSections() {
+    const bpmn = els['input_type_bpmn'].checked;
+    if (bpmn === lastInputTypeBpmn) return;
+    lastInputTypeBpmn = bpmn;
+
+    els['bpmn-upload-section'].style.display = bpmn ? 'block' : 'none';
+    els['xml-paste-section'].style.display = bpmn ? 'none' : 'block';
+    (bpmn ? els['bpmn_file'] : els['xml_code']).setAttribute('required', 'required');
+    (bpmn ? els['xml_code'] : els['bpmn_file']).removeAttribute('required');
+}
+
+els['input_type_bpmn'].addEventListener('change', toggleInputSections, { passive: true });
+els['input_type_xml'].addEventListener('change', toggleInputSections, { passive: true });
+
+els['sop-form'].addEventListener('submit', async function(e) {
+    e.preventDefault();
+
+    const btn = els['generate-btn'];
+    const loader = els['loader'];
+    const form = e.target;
+
+    loader.style.display = 'block';
+    btn.disabled = true;
+    btn.textContent = 'Generating...';
+
+    try {
+        // Multipart only when a file is being uploaded; pasted XML goes as JSON,
+        // with the repeated row fields as arrays
+        const formData = new FormData(form);
+        let body = formData;
+        let headers = {};
+        if (!els['input_type_bpmn'].checked) {
+            const fields = {};
+            for (const [key, value] of formData) {
+                if (typeof value !== 'string') continue;  // the empty file input
+                fields[key] = fields[key] === undefined ? value : [].concat(fields[key], value);
+            }
+            body = JSON.stringify(fields);
+            headers = {'Content-Type': 'application/json'};
+        }
+        const response = await fetch('/generate', {
+            method: 'POST',
+            headers: headers,
+            body: body
+        });
+
+        const result = await response.json();
+
+        if (result.success) {
+            // Refresh the lists before the (blocking) alert. The response
+            // already carries the updated history; only archives need a fetch.
+            invalidateCachedJson(HISTORY_CACHE_KEY);
+            invalidateCachedJson(ARCHIVES_CACHE_KEY);
+            if (result.history) {
+                historyData = result.history;
+                populateHistoryDropdown();
+            } else {
+                fetchHistory();
+            }
+            loadArchives();
+            alert('Document saved successfully!\n\n' + result.path);
+        } else {
+            alert(result.message || 'Generation cancelled or failed');
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        alert('An error occurred during generation');
+    } finally {
+        loader.style.display = 'none';
+        btn.disabled = false;
+        btn.textContent = 'Generate SOP Document';
+    }
+});
+
+// Archive functions
+async function loadArchives() {
+    try {
+        await cachedFetchJson('/api/archive/list', ARCHIVES_CACHE_KEY, data => {
+            displayArchives(data.archives || []);
+        });
+    } catch (error) {
+        console.error('Error loading archives:', error);
+    }
+}
+
+let archivesById = new Map();
+
+function displayArchives(archives) {
+    archives = archives || [];
+    archivesById = new Map(archives.map(archive => [String(archive.id), archive]));
+    fillSelectWhenIdle(els['archive-select'], '<option value="">-- Select a backup --</option>', archives, archive => {
+        const dateTime = DT_FMT.format(new Date(archive.created_at));
+        return '<option value="' + archive.id + '">' + escapeAttr(`${archive.process_name} - ${dateTime}`) + '</option>';
+    }, selected => {
+        // Keep the current selection if that backup still exists
+        if (archivesById.has(selected)) {
+            els['archive-select'].value = selected;
+        } else {
+            els['archive-actions'].style.display = 'none';
+        }
+    });
+}
+
+els['archive-select'].addEventListener('change', onArchiveSelect, { passive: true });
+
+function onArchiveSelect() {
+    const select = els['archive-select'];
+    const actions = els['archive-actions'];
+    actions.style.display = select.value !== '' ? 'flex' : 'none';
+}
+
+function getSelectedArchiveId() {
+    const select = els['archive-select'];
+    const archive = archivesById.get(select.value);
+    return archive ? archive.id : null;
+}
+
+// In a browser the file is downloaded straight from the archive endpoint. The
+// desktop window (pywebview) has no download handling, so there the server
+// shows a native save dialog and reports where the file went.
+async function downloadArchiveFile(kind, savedLabel) {
+    const id = getSelectedArchiveId();
+    if (!id) return;
+    if (!window.pywebview) {
+        const link = document.createElement('a');
+        link.href = `/api/archive/${id}/${kind}?download=1`;
+        link.download = '';
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+        return;
+    }
+    const response = await fetch(`/api/archive/${id}/${kind}`);
+    const result = await response.json();
+    if (result.success) {
+        alert(savedLabel + ' saved to: ' + result.path);
+    }
+}
+
+function downloadBpmn() {
+    return downloadArchiveFile('bpmn', 'BPMN');
+}
+
+function downloadDocx() {
+    return downloadArchiveFile('docx', 'Document');
+}
+
+async function deleteSelectedArchive() {
+    const id = getSelectedArchiveId();
+    if (!id) return;
+    if (!confirm('Delete this backup?')) return;
+    try {
+        const response = await fetch(`/api/archive/${id}`, { method: 'DELETE' });
+        const result = await response.json();
+        if (result.success) {
+            els['archive-actions'].style.display = 'none';
+            loadArchives();
+        }
+    } catch (error) {
+        console.error('Error deleting:', error);
+    }
+}
+
+// History and archives are only fetched once the user reaches for their
+// dropdown (see init), keeping both requests off the page-load path
+function loadOnFirstUse(select, load) {
+    let loaded = false;
+    function onFirstUse() {
+        if (loaded) return;
+        loaded = true;
+        load();
+    }
+    // focus covers keyboard navigation; mousedown fires before the list opens
+    select.addEventListener('mousedown', onFirstUse, { once: true, passive: true });
+    select.addEventListener('focus', onFirstUse, { once: true, passive: true });
+}
+
+// --- Toggle Metadata Sections ---
+function toggleMetadata() {
+    const sections = els['metadata-sections'];
+    const btn = els['toggle-metadata-btn'];
+    if (sections.style.display === 'none') {
+        sections.style.display = 'block';
+        btn.innerHTML = '&#9660; Hide Metadata &amp; Settings';
+    } else {
+        sections.style.display = 'none';
+        btn.innerHTML = '&#9654; Show Metadata &amp; Settings';
+    }
+}
+
+// --- BPMN Metadata Auto-Fill ---
+
+function resetFormFields() {
+    // Clear text fields
+    ['process_name', 'process_code', 'purpose', 'scope'].forEach(id => {
+        const field = els[id];
+        if (field) {
+            field.value = '';
+            field.classList.remove('autofilled');
+        }
+    });
+
+    // Reset each list to one empty entry
+    for (const kind in ROW_SPECS) {
+        setRows(kind, []);
+    }
+}
+
+function autoFillFromBpmn(metadata) {
+    // Simple text fields - only fill if currently empty
+    const fieldMappings = {
+        'process_name': 'process_name',
+        'process_code': 'process_code',
+        'purpose': 'purpose',
+        'scope': 'scope'
+    };
+
+    for (const [metaKey, fieldId] of Object.entries(fieldMappings)) {
+        if (metadata[metaKey]) {
+            const field = els[fieldId];
+            if (field && !field.value.trim()) {
+                field.value = metadata[metaKey];
+                field.classList.add('autofilled');
+            }
+        }
+    }
+
+    // Abbreviations - only auto-fill if current entries are all empty
+    const abbreviations = metadata.abbreviations_list || [];
+    if (abbreviations.length > 0 && rowsEmpty('abbrev')) {
+        setRows('abbrev', abbreviations.map(abbrev => [abbrev.term, abbrev.definition]), true);
+    }
+
+    // Referenced Documents & Approvals - auto-fill with lane approvals + DMG row
+    const laneNames = metadata.lane_names || [];
+    if (laneNames.length > 0 && rowsEmpty('ref')) {
+        // Add lane approval rows: N/A | {Lane Name} Approval
+        const refs = laneNames.map(laneName => ['N/A', laneName + ' Approval']);
+
+        // Add DMG row: DMG-{process_code} | {process_name} Process Diagram        Notations Meaning
+        const pCode = metadata.process_code || '';
+        const pName = metadata.process_name || '';
+        if (pCode || pName) {
+            const dmgId = pCode ? 'DGM- ' + pCode : 'DGM-';
+            const dmgTitle = pName + ' Process Diagram        Notations Meaning';
+            refs.push([dmgId, dmgTitle]);
+        }
+        setRows('ref', refs, true);
+    }
+
+    // General Policies - auto-fill from BPMN
+    const policies = metadata.general_policies_list || [];
+    if (policies.length > 0 && rowsEmpty('policy')) {
+        setRows('policy', policies.map(policy => [policy.ref, policy.policy]), true);
+    }
+}
+
+// Drop the autofill highlight the first time a field is edited. One delegated
+// listener covers every field; removing an absent class is a no-op.
+els['sop-form'].addEventListener('input', function(e) {
+    e.target.classList.remove('autofilled');
+}, { passive: true });
+
+// Cheap sniff for a BPMN root/process element, so obviously unrelated
+// text or files don't cost a round trip and a server-side parse
+const BPMN_SNIFF_RE = /<(?:[\w-]+:)?(?:definitions|process)\b/i;
+const BPMN_SNIFF_BYTES = 4096;
+
+// Auto-fill form from BPMN metadata when file is selected
+els['bpmn_file'].addEventListener('change', async function(e) {
+    const file = e.target.files[0];
+    if (!file) return;
+    if (!BPMN_SNIFF_RE.test(await file.slice(0, BPMN_SNIFF_BYTES).text())) return;
+
+    const btn = els['generate-btn'];
+    const originalText = btn.textContent;
+    btn.textContent = 'Reading BPMN metadata...';
+    btn.disabled = true;
+
+    try {
+        const formData = new FormData();
+        formData.append('bpmn_file', file);
+
+        const response = await fetch('/extract-metadata', {
+            method: 'POST',
+            body: formData
+        });
+
+        if (response.ok) {
+            const data = await response.json();
+            if (data.success && data.metadata) {
+                resetFormFields();
+                autoFillFromBpmn(data.metadata);
+                // Auto-expand the metadata section so user can see filled fields
+                const sections = els['metadata-sections'];
+                if (sections.style.display === 'none') {
+                    toggleMetadata();
+                }
+            }
+        }
+    } catch (error) {
+        console.error('Error extracting BPMN metadata:', error);
+    } finally {
+        btn.textContent = originalText;
+        btn.disabled = false;
+    }
+}, { passive: true });
+
+// Auto-fill form from BPMN metadata when XML is pasted
+let xmlExtractTimer = null;
+els['xml_code'].addEventListener('input', function() {
+    // Debounce: wait 800ms after user stops typing/pasting
+    clearTimeout(xmlExtractTimer);
+    const xmlText = this.value.trim();
+    if (!xmlText || xmlText.length < 50) return; // Too short to be valid BPMN
+    if (!BPMN_SNIFF_RE.test(xmlText)) return;
+    xmlExtractTimer = setTimeout(async () => {
+        const btn = els['generate-btn'];
+        const originalText = btn.textContent;
+        btn.textContent = 'Reading BPMN metadata...';
+        btn.disabled = true;
+
+        try {
+            const formData = new FormData();
+            formData.append('xml_code', xmlText);
+
+            const response = await fetch('/extract-metadata', {
+                method: 'POST',
+                body: formData
+            });
+
+            if (response.ok) {
+                const data = await response.json();
+                if (data.success && data.metadata) {
+                    resetFormFields();
+                    autoFillFromBpmn(data.metadata);
+                    const sections = els['metadata-sections'];
+                    if (sections.style.display === 'none') {
+                        toggleMetadata();
+                    }
+                }
+            }
+        } catch (error) {
+            console.error('Error extracting BPMN metadata from XML:', error);
+        } finally {
+            btn.textContent = originalText;
+            btn.disabled = false;
+        }
+    }, 800);
+}, { passive: true });
+
+// Page setup, in one place
+document.addEventListener('DOMContentLoaded', function init() {
+    setTodaysDate();
+    toggleInputSections();
+    for (const kind in ROW_SPECS) {
+        installRemoveDelegation(els[ROW_SPECS[kind].container], ROW_SPECS[kind].minMsg);
+    }
+    loadOnFirstUse(els['history-select'], fetchHistory);
+    loadOnFirstUse(els['archive-select'], loadArchives);
+}, { once: true, passive: true });
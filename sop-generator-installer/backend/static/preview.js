@@ -0,0 +1,96 @@
+// Auto-fill today's date
+(function() {
+    var d = new Date();
+    var months = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec'];
+    document.getElementById('release_date').value =
+        String(d.getDate()).padStart(2,'0') + ' ' + months[d.getMonth()] + ' ' + d.getFullYear();
+})();
+
+function selectTemplate(name) {
+    document.getElementById('template-input').value = name;
+    // Styling lives in .template-btn / .template-btn.active
+    document.querySelectorAll('[data-template]').forEach(function(btn) {
+        btn.classList.toggle('active', btn.dataset.template === name);
+    });
+}
+
+function addEntry(containerId, name1, name2, placeholder1, placeholder2) {
+    var container = document.getElementById(containerId);
+    var div = document.createElement('div');
+    div.className = 'entry';
+    div.innerHTML =
+        '<input type="text" name="' + name1 + '" placeholder="' + placeholder1 + '">' +
+        '<input type="text" name="' + name2 + '" placeholder="' + placeholder2 + '">' +
+        '<button type="button" class="remove-btn" onclick="removeEntry(this)">X</button>';
+    container.appendChild(div);
+}
+
+function removeEntry(btn) {
+    var container = btn.parentElement.parentElement;
+    if (container.children.length > 1) {
+        btn.parentElement.remove();
+    }
+}
+
+function closeModal() {
+    // Tell parent (Camunda Modeler) to close the modal
+    if (window.parent && window.parent !== window) {
+        window.parent.postMessage('sop-close-modal', '*');
+    } else {
+        window.close();
+    }
+}
+
+function resetGenerateButton() {
+    var btn = document.getElementById('generate-btn');
+    btn.disabled = false;
+    btn.innerHTML = 'Generate & Download .docx';
+}
+
+function filenameFromDisposition(disposition) {
+    var utf8Match = disposition.match(/filename\*=UTF-8''([^;]+)/i);
+    if (utf8Match) return decodeURIComponent(utf8Match[1]);
+    var match = disposition.match(/filename="?([^";]+)"?/);
+    return match ? match[1] : 'SOP_Document.docx';
+}
+
+// Handle form submit - post straight to the backend (this page is served by it)
+// and download the result here; the parent window is only asked to close the modal
+document.getElementById('sop-form').addEventListener('submit', function(e) {
+    e.preventDefault();
+
+    var btn = document.getElementById('generate-btn');
+    btn.disabled = true;
+    btn.innerHTML = '<span class="spinner"></span>Generating...';
+
+    fetch('/api/generate-and-download/' + this.dataset.sessionId, {
+        method: 'POST',
+        body: new FormData(this)
+    })
+    .then(function(response) {
+        if (!response.ok) throw new Error('Server error');
+        var filename = filenameFromDisposition(response.headers.get('Content-Disposition') || '');
+        return response.blob().then(function(blob) {
+            return { blob: blob, filename: filename };
+        });
+    })
+    .then(function(result) {
+        var url = URL.createObjectURL(result.blob);
+        var a = document.createElement('a');
+        a.href = url;
+        a.download = result.filename;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        // Revoke once the download has had a chance to start
+        setTimeout(function() { URL.revokeObjectURL(url); }, 1000);
+
+        resetGenerateButton();
+        setTimeout(closeModal, 500);
+    })
+    .catch(function(err) {
+        console.error('[SOP Generator] Generate failed:', err);
+        resetGenerateButton();
+        window.alert('Error generating document. Please try again.');
+    });
+});
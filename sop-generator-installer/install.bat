@@ -35,11 +35,13 @@ set "BACKEND_DIR=%LOCALAPPDATA%\SOP_Generator\backend"
 echo Installing backend to: %BACKEND_DIR%
 
 if not exist "%BACKEND_DIR%\templates" mkdir "%BACKEND_DIR%\templates"
+if not exist "%BACKEND_DIR%\static" mkdir "%BACKEND_DIR%\static"
 
 REM --- Step 4: Copy backend files ---
 echo Copying backend files...
 xcopy /Y /Q "%~dp0backend\*.*" "%BACKEND_DIR%\" >nul
 xcopy /Y /Q "%~dp0backend\templates\*.*" "%BACKEND_DIR%\templates\" >nul
+xcopy /Y /Q "%~dp0backend\static\*.*" "%BACKEND_DIR%\static\" >nul
 if errorlevel 1 (
     echo [ERROR] Failed to copy backend files.
     pause
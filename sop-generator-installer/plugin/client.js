@@ -120,8 +120,9 @@
     .then(function(response) {
       if (!response.ok) throw new Error('Server error');
       var disposition = response.headers.get('Content-Disposition') || '';
-      var match = disposition.match(/filename="?([^"]+)"?/);
-      var filename = match ? match[1] : 'SOP_Document.docx';
+      var utf8Match = disposition.match(/filename\*=UTF-8''([^;]+)/i);
+      var match = disposition.match(/filename="?([^";]+)"?/);
+      var filename = utf8Match ? decodeURIComponent(utf8Match[1]) : (match ? match[1] : 'SOP_Document.docx');
       return response.blob().then(function(blob) {
         return { blob: blob, filename: filename };
       });